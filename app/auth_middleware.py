@@ -5,103 +5,159 @@ Validates X-API-Key header against environment variable.
 """
 
 import os
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+import hmac
+import json
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class APIKeyMiddleware(BaseHTTPMiddleware):
+def _json_body(content: dict) -> bytes:
+    """Serialize a JSON body the same way Starlette's JSONResponse does."""
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+def _json_headers(body: bytes, headers: list) -> list:
+    """Complete a raw header list with the JSON content type and length."""
+    return headers + [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1"))
+    ]
+
+
+# Endpoints reachable without an API key, as raw (undecoded) request paths
+_HEALTH_PATH = b"/health"
+_VALIDATE_PATH = b"/validate"
+
+# Rejection responses never change, so serialize them once at import
+_SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY")
+]
+_UNAUTHORIZED_HEADERS = [(b"www-authenticate", b"ApiKey")] + _SECURITY_HEADERS
+
+_BODY_503 = _json_body({
+    "error": "Service Unavailable",
+    "message": "API key not configured on server. Contact administrator."
+})
+_HEADERS_503 = _json_headers(_BODY_503, _SECURITY_HEADERS)
+
+_BODY_401_MISSING = _json_body({
+    "error": "Unauthorized",
+    "message": "API key required. Please provide X-API-Key header."
+})
+_HEADERS_401_MISSING = _json_headers(_BODY_401_MISSING, _UNAUTHORIZED_HEADERS)
+
+_BODY_401_INVALID = _json_body({
+    "error": "Unauthorized",
+    "message": "Invalid API key provided."
+})
+_HEADERS_401_INVALID = _json_headers(_BODY_401_INVALID, _UNAUTHORIZED_HEADERS)
+
+# Headers forced onto OPTIONS (CORS preflight) responses, replacing any existing values
+_OPTIONS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS"),
+    (b"access-control-allow-headers", b"X-API-Key, Content-Type, Authorization")
+] + _SECURITY_HEADERS
+_OPTIONS_HEADER_NAMES = frozenset(name for name, _ in _OPTIONS_HEADERS)
+
+
+class APIKeyMiddleware:
     """
     Middleware to validate API key for all requests.
     Checks X-API-Key header against API_KEY environment variable.
+
+    Implemented as a plain ASGI middleware so requests are passed straight
+    to the downstream app without BaseHTTPMiddleware's task group and
+    response streaming wrapper.
     """
-    
+
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
         self.api_key = os.getenv("API_KEY")
-        
+
         if not self.api_key:
             print("WARNING: API_KEY environment variable is not set - service will reject all requests")
             print("Please set API_KEY environment variable to secure the service")
             self.api_key = None
-    
-    async def dispatch(self, request: Request, call_next):
+
+        # Encode once so each request only pays for the constant-time compare
+        self.api_key_bytes = self.api_key.encode("utf-8") if self.api_key else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """
         Process request and validate API key.
         Returns 401 if API key is missing or invalid.
         Allows OPTIONS requests (CORS preflight) and health endpoint to pass through.
         """
+        # Only HTTP requests are authenticated here (websocket/lifespan pass through)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Allow OPTIONS requests (CORS preflight) to pass through without authentication
-        if request.method == "OPTIONS":
-            response = await call_next(request)
-            # Add CORS headers to OPTIONS response
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "X-API-Key, Content-Type, Authorization"
-            response.headers["X-Content-Type-Options"] = "nosniff"
-            response.headers["X-Frame-Options"] = "DENY"
-            return response
-        
+        if scope["method"] == "OPTIONS":
+            async def send_with_cors_headers(message: Message):
+                if message["type"] == "http.response.start":
+                    # Add CORS headers to OPTIONS response
+                    headers = [
+                        (name, value) for name, value in message.get("headers", [])
+                        if name.lower() not in _OPTIONS_HEADER_NAMES
+                    ]
+                    headers.extend(_OPTIONS_HEADERS)
+                    message["headers"] = headers
+                await send(message)
+
+            await self.app(scope, receive, send_with_cors_headers)
+            return
+
         # Allow health and validate endpoints to pass through without authentication
-        if request.url.path in ["/health", "/validate"]:
-            response = await call_next(request)
-            response.headers["X-Content-Type-Options"] = "nosniff"
-            response.headers["X-Frame-Options"] = "DENY"
-            return response
-        
+        # With only two exempt paths, direct bytes compares on raw_path beat hashing
+        # the decoded path; raw_path is optional in ASGI, so fall back to path
+        raw_path = scope.get("raw_path") or scope["path"].encode("utf-8")
+        if raw_path == _HEALTH_PATH or raw_path == _VALIDATE_PATH:
+            await self.app(scope, receive, self._with_security_headers(send))
+            return
+
         # If no API key is configured on the server, reject all requests
         if not self.api_key:
-            return JSONResponse(
-                status_code=503,
-                content={
-                    "error": "Service Unavailable",
-                    "message": "API key not configured on server. Contact administrator."
-                },
-                headers={
-                    "X-Content-Type-Options": "nosniff",
-                    "X-Frame-Options": "DENY"
-                }
-            )
-        
-        # Get API key from header
-        provided_api_key = request.headers.get("X-API-Key")
-        
+            await self._send_static(send, 503, _HEADERS_503, _BODY_503)
+            return
+
+        # Get API key from the raw header list without building a Headers object
+        provided_api_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                provided_api_key = value
+                break
+
         # Check if API key is provided
         if not provided_api_key:
-            return JSONResponse(
-                status_code=401,
-                content={
-                    "error": "Unauthorized",
-                    "message": "API key required. Please provide X-API-Key header."
-                },
-                headers={
-                    "WWW-Authenticate": "ApiKey",
-                    "X-Content-Type-Options": "nosniff",
-                    "X-Frame-Options": "DENY"
-                }
-            )
-        
-        # Validate API key
-        if provided_api_key != self.api_key:
-            return JSONResponse(
-                status_code=401,
-                content={
-                    "error": "Unauthorized", 
-                    "message": "Invalid API key provided."
-                },
-                headers={
-                    "WWW-Authenticate": "ApiKey",
-                    "X-Content-Type-Options": "nosniff",
-                    "X-Frame-Options": "DENY"
-                }
-            )
-        
-        # API key is valid, proceed with request
-        response = await call_next(request)
-        
-        # Add security headers to response
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        
-        return response
\ No newline at end of file
+            await self._send_static(send, 401, _HEADERS_401_MISSING, _BODY_401_MISSING)
+            return
+
+        # Validate API key with a constant-time comparison to avoid leaking
+        # how much of the key matched through response timing
+        if not hmac.compare_digest(provided_api_key, self.api_key_bytes):
+            await self._send_static(send, 401, _HEADERS_401_INVALID, _BODY_401_INVALID)
+            return
+
+        # API key is valid, proceed with request and add security headers to response
+        await self.app(scope, receive, self._with_security_headers(send))
+
+    @staticmethod
+    def _with_security_headers(send: Send) -> Send:
+        """Wrap send so the response start message carries the security headers."""
+        async def send_with_security_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Downstream responses never set these, so append raw tuples
+                # instead of paying for MutableHeaders' scan-and-replace
+                message["headers"] = [*message.get("headers", ()), *_SECURITY_HEADERS]
+            await send(message)
+
+        return send_with_security_headers
+
+    @staticmethod
+    async def _send_static(send: Send, status_code: int, headers: list, body: bytes):
+        """Send a pre-serialized response directly over ASGI."""
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -1,24 +1,60 @@
 # app/credential_utils.py
 import os
 import json
-import tempfile
-from typing import Optional, Dict, Any, Tuple
-from google.oauth2 import service_account
-from google.auth import default
-from google import generativeai as genai
-from google.cloud import storage
-from elevenlabs.client import ElevenLabs
-from openai import OpenAI
+import hmac
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
 from app.mcp_models import UserCredentials, VideoGenerationParameters
 
-# Supported video generation models
-SUPPORTED_VIDEO_MODELS = [
+# Google SDKs are imported inside the functions that use them to keep
+# process start-up cheap; this import is for type annotations only
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+
+@dataclass(frozen=True)
+class _EnvDefaults:
+    """Server-side credential defaults, read from the environment once at import."""
+    gemini_api_key: Optional[str]
+    openai_api_key: Optional[str]
+    google_cloud_project: str
+    vertex_ai_region: str
+    gcs_bucket: Optional[str]
+    elevenlabs_api_key: Optional[str]
+    vertex_model_id: str
+    gcp_creds_path: Optional[str]
+
+
+_ENV = _EnvDefaults(
+    gemini_api_key=os.getenv("GEMINI_API_KEY"),
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    google_cloud_project=os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school"),
+    vertex_ai_region=os.getenv("VERTEX_AI_REGION", "us-central1"),
+    gcs_bucket=os.getenv("GCS_BUCKET"),
+    elevenlabs_api_key=os.getenv("XI_KEY"),
+    vertex_model_id=os.getenv("VEO_MODEL_ID", "veo-3.0-generate-preview"),
+    gcp_creds_path=os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH"),
+)
+
+# Supported video generation models (ordered tuple keeps error messages stable)
+_SUPPORTED_VIDEO_MODELS_ORDERED = (
     "veo-3.0-generate-preview",
     "veo-2.0-generate-preview", 
     "veo-1.0-generate-preview",
     "imagen-3.0-generate-001",
     "imagen-3.0-fast-generate-001"
-]
+)
+SUPPORTED_VIDEO_MODELS = frozenset(_SUPPORTED_VIDEO_MODELS_ORDERED)
+_SUPPORTED_VIDEO_MODELS_STR = ", ".join(_SUPPORTED_VIDEO_MODELS_ORDERED)
+
+# Supported aspect ratios for video generation
+_VALID_ASPECT_RATIOS_ORDERED = ("16:9", "9:16", "1:1", "4:3", "3:4")
+_VALID_ASPECT_RATIOS = frozenset(_VALID_ASPECT_RATIOS_ORDERED)
+_VALID_ASPECT_RATIOS_STR = ", ".join(_VALID_ASPECT_RATIOS_ORDERED)
 
 def validate_video_parameters(parameters: Optional[VideoGenerationParameters]) -> Tuple[bool, Optional[str]]:
     """
@@ -30,7 +66,7 @@ def validate_video_parameters(parameters: Optional[VideoGenerationParameters]) -
     
     # Validate model selection
     if parameters.model and parameters.model not in SUPPORTED_VIDEO_MODELS:
-        return False, f"Unsupported video model '{parameters.model}'. Supported models: {', '.join(SUPPORTED_VIDEO_MODELS)}"
+        return False, f"Unsupported video model '{parameters.model}'. Supported models: {_SUPPORTED_VIDEO_MODELS_STR}"
     
     # Validate duration
     if parameters.durationSeconds:
@@ -39,9 +75,8 @@ def validate_video_parameters(parameters: Optional[VideoGenerationParameters]) -
     
     # Validate aspect ratio
     if parameters.aspectRatio:
-        valid_ratios = ["16:9", "9:16", "1:1", "4:3", "3:4"]
-        if parameters.aspectRatio not in valid_ratios:
-            return False, f"Unsupported aspect ratio '{parameters.aspectRatio}'. Supported ratios: {', '.join(valid_ratios)}"
+        if parameters.aspectRatio not in _VALID_ASPECT_RATIOS:
+            return False, f"Unsupported aspect ratio '{parameters.aspectRatio}'. Supported ratios: {_VALID_ASPECT_RATIOS_STR}"
     
     # Validate sample count
     if parameters.sampleCount:
@@ -51,60 +86,154 @@ def validate_video_parameters(parameters: Optional[VideoGenerationParameters]) -
     return True, None
 
 
+def _pick(user_value: Optional[Any], default: Optional[Any]) -> Optional[Any]:
+    """Return the user-provided value if set, otherwise the server default."""
+    return user_value if user_value else default
+
+
 def get_credentials_or_default(user_creds: Optional[UserCredentials]) -> Dict[str, Any]:
     """
     Extract credentials from user request or fall back to environment variables.
     Returns a dictionary with all necessary credential information.
     """
     return {
-        'gemini_api_key': user_creds.gemini_api_key if user_creds else None or os.getenv("GEMINI_API_KEY"),
-        'openai_api_key': os.getenv("OPENAI_API_KEY"),  # Always use internal OpenAI key
+        'gemini_api_key': _pick(user_creds and user_creds.gemini_api_key, _ENV.gemini_api_key),
+        'openai_api_key': _ENV.openai_api_key,  # Always use internal OpenAI key
         'google_cloud_credentials': user_creds.google_cloud_credentials if user_creds else None,
-        'google_cloud_project': user_creds.google_cloud_project if user_creds else None or os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school"),
-        'vertex_ai_region': user_creds.vertex_ai_region if user_creds else None or os.getenv("VERTEX_AI_REGION", "us-central1"),
-        'gcs_bucket': user_creds.gcs_bucket if user_creds else None or os.getenv("GCS_BUCKET"),
-        'elevenlabs_api_key': user_creds.elevenlabs_api_key if user_creds else None or os.getenv("XI_KEY"),
-        'vertex_model_id': os.getenv("VEO_MODEL_ID", "veo-3.0-generate-preview")  # Not user-configurable for now
+        'google_cloud_project': _pick(user_creds and user_creds.google_cloud_project, _ENV.google_cloud_project),
+        'vertex_ai_region': _pick(user_creds and user_creds.vertex_ai_region, _ENV.vertex_ai_region),
+        'gcs_bucket': _pick(user_creds and user_creds.gcs_bucket, _ENV.gcs_bucket),
+        'elevenlabs_api_key': _pick(user_creds and user_creds.elevenlabs_api_key, _ENV.elevenlabs_api_key),
+        'vertex_model_id': _ENV.vertex_model_id  # Not user-configurable for now
     }
 
 
+_CLOUD_PLATFORM_SCOPES = ('https://www.googleapis.com/auth/cloud-platform',)
+
+
+# Parsed service account credentials, keyed by (client_email, private_key_id)
+# so the cache doesn't hold the key JSON itself. Each entry also stores a
+# digest of the full JSON, and a key presented with different material under
+# the same identifiers is rebuilt rather than served the cached credentials
+_SA_CACHE_MAXSIZE = 64
+_sa_credentials = OrderedDict()
+_sa_credentials_lock = threading.Lock()
+
+
+def _build_sa_from_info(info: Dict[str, Any]):
+    """Parse service account credentials from a key dict (cached per key)."""
+    cache_key = (info.get('client_email'), info.get('private_key_id'))
+    digest = hashlib.sha256(json.dumps(info, sort_keys=True).encode('utf-8')).digest()
+    with _sa_credentials_lock:
+        cached = _sa_credentials.get(cache_key)
+        if cached is not None and hmac.compare_digest(cached[0], digest):
+            _sa_credentials.move_to_end(cache_key)
+            return cached[1]
+    
+    from google.oauth2 import service_account
+    credentials = service_account.Credentials.from_service_account_info(
+        info,
+        scopes=list(_CLOUD_PLATFORM_SCOPES)
+    )
+    with _sa_credentials_lock:
+        _sa_credentials[cache_key] = (digest, credentials)
+        _sa_credentials.move_to_end(cache_key)
+        while len(_sa_credentials) > _SA_CACHE_MAXSIZE:
+            _sa_credentials.popitem(last=False)
+    return credentials
+
+
+@lru_cache(maxsize=8)
+def _build_sa_from_file(path: str):
+    """Load service account credentials from a key file (cached per path)."""
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_file(
+        path,
+        scopes=list(_CLOUD_PLATFORM_SCOPES)
+    )
+
+
+@lru_cache(maxsize=1)
+def _build_adc():
+    """Resolve Application Default Credentials once per process."""
+    from google.auth import default
+    credentials, _ = default()
+    return credentials
+
+
 def create_google_cloud_credentials(creds_dict: Dict[str, Any], google_cloud_credentials: Optional[Dict[str, Any]]):
     """
     Create Google Cloud credentials object from user-provided JSON dict or environment.
     Returns (credentials, credentials_path) tuple.
+
+    Credentials objects are memoized, so repeated calls with the same service
+    account (or the same environment fallback) reuse one parsed instance.
     """
     if google_cloud_credentials:
         # User provided credentials as JSON dict
-        credentials = service_account.Credentials.from_service_account_info(
-            google_cloud_credentials,
-            scopes=['https://www.googleapis.com/auth/cloud-platform']
-        )
+        credentials = _build_sa_from_info(google_cloud_credentials)
         return credentials, None
     else:
         # Fall back to environment credentials
-        vertex_credentials_path = os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH")
+        vertex_credentials_path = _ENV.gcp_creds_path
         if vertex_credentials_path:
-            credentials = service_account.Credentials.from_service_account_file(
-                vertex_credentials_path,
-                scopes=['https://www.googleapis.com/auth/cloud-platform']
-            )
+            credentials = _build_sa_from_file(vertex_credentials_path)
             return credentials, vertex_credentials_path
         else:
             # Use default credentials
-            credentials, _ = default()
-            return credentials, None
+            return _build_adc(), None
 
 
-def create_storage_client(creds_dict: Dict[str, Any]) -> storage.Client:
-    """Create Google Cloud Storage client with appropriate credentials."""
-    if creds_dict['google_cloud_credentials']:
-        return storage.Client.from_service_account_info(creds_dict['google_cloud_credentials'])
-    else:
-        gcs_credentials_path = os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH")
-        if gcs_credentials_path:
-            return storage.Client.from_service_account_json(gcs_credentials_path)
-        else:
-            return storage.Client()
+# Connection pool sizing for each storage client's HTTP session
+_STORAGE_POOL_HOSTS = 4
+_STORAGE_POOL_MAXSIZE = 32
+
+
+@lru_cache(maxsize=32)
+def _build_storage_client(credentials, project: Optional[str]) -> "storage.Client":
+    """
+    Build one storage client per (memoized) credentials object, so validation
+    and job execution share one authorized session and its connection pool.
+    Keying on the credentials object itself, which create_google_cloud_credentials
+    only reuses for the exact same key material, means a client is never shared
+    between different keys.
+    """
+    from google.cloud import storage
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+    
+    # Size the client's authorized session pool for concurrent uploads so
+    # parallel blob writes reuse keep-alive connections instead of opening
+    # (and then discarding) extra ones beyond requests' default of 10
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=_STORAGE_POOL_HOSTS,
+        pool_maxsize=_STORAGE_POOL_MAXSIZE
+    ))
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+
+def create_storage_client(creds_dict: Dict[str, Any], credentials=None) -> "storage.Client":
+    """
+    Create Google Cloud Storage client with appropriate credentials.
+    Clients are pooled per credentials object and reused across calls.
+    If an already-built credentials object is passed, it is used directly
+    instead of resolving the credentials again.
+    """
+    if credentials is None:
+        credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict.get('google_cloud_credentials'))
+    # Service account keys carry their own project; ADC falls back to the environment
+    project = getattr(credentials, 'project_id', None) or creds_dict.get('google_cloud_project')
+    return _build_storage_client(credentials, project)
+
+
+# API keys checked for a plausible minimum length: (creds_dict key, label for error message)
+_MIN_API_KEY_LENGTH = 20
+_MIN_KEY_LEN_CHECKS = (
+    ('openai_api_key', "Internal OpenAI API key"),
+    ('gemini_api_key', "Gemini API key"),
+    ('elevenlabs_api_key', "ElevenLabs API key"),
+)
 
 
 def validate_credentials(creds_dict: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
@@ -130,31 +259,24 @@ def validate_credentials(creds_dict: Dict[str, Any]) -> Tuple[bool, Optional[str
         
         # Test Google Cloud credentials by creating credentials object
         try:
-            create_google_cloud_credentials(creds_dict, creds_dict['google_cloud_credentials'])
+            google_credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict['google_cloud_credentials'])
         except Exception as e:
             return False, f"Invalid Google Cloud credentials: {str(e)}"
         
-        # Test storage client creation (lighter validation)
+        # Test storage client creation (lighter validation), reusing the parsed credentials
         try:
-            storage_client = create_storage_client(creds_dict)
+            storage_client = create_storage_client(creds_dict, credentials=google_credentials)
             # Just ensure we can create a bucket reference (doesn't make API call)
             bucket = storage_client.bucket(creds_dict['gcs_bucket'])
         except Exception as e:
             return False, f"Cannot create storage client: {str(e)}"
         
-        # Basic validation for API keys
-        # OpenAI key is internal - validate it exists and has reasonable length
-        if creds_dict.get('openai_api_key') and len(creds_dict['openai_api_key']) < 20:
-            return False, "Internal OpenAI API key appears to be invalid (too short)"
-        
-        # Gemini key is optional and user-provided
-        if creds_dict.get('gemini_api_key') and len(creds_dict['gemini_api_key']) < 20:
-            return False, "Gemini API key appears to be invalid (too short)"
-        
-        # Basic validation for ElevenLabs (only if provided)
-        if creds_dict.get('elevenlabs_api_key'):
-            if len(creds_dict['elevenlabs_api_key']) < 20:
-                return False, "ElevenLabs API key appears to be invalid (too short)"
+        # Basic length validation for API keys that are present
+        # (OpenAI is internal, Gemini and ElevenLabs are optional and user-provided)
+        for key, label in _MIN_KEY_LEN_CHECKS:
+            value = creds_dict.get(key)
+            if value and len(value) < _MIN_API_KEY_LENGTH:
+                return False, f"{label} appears to be invalid (too short)"
         
         return True, None
         
@@ -162,24 +284,19 @@ def validate_credentials(creds_dict: Dict[str, Any]) -> Tuple[bool, Optional[str
         return False, f"Credential validation error: {str(e)}"
 
 
+# Sensitive keys stripped from job metadata (OpenAI key is internal so still needs to be cleared)
+_SENSITIVE_KEYS = frozenset({
+    'gemini_api_key',
+    'openai_api_key',
+    'google_cloud_credentials', 
+    'elevenlabs_api_key',
+    'credentials'
+})
+
+
 def clear_sensitive_data(job_meta: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove sensitive credential data from job metadata.
     Returns cleaned metadata dict.
     """
-    cleaned_meta = job_meta.copy()
-    
-    # Remove sensitive keys (OpenAI key is internal so still needs to be cleared from job metadata)
-    sensitive_keys = [
-        'gemini_api_key',
-        'openai_api_key',
-        'google_cloud_credentials', 
-        'elevenlabs_api_key',
-        'credentials'
-    ]
-    
-    for key in sensitive_keys:
-        if key in cleaned_meta:
-            del cleaned_meta[key]
-    
-    return cleaned_meta
\ No newline at end of file
+    return {key: value for key, value in job_meta.items() if key not in _SENSITIVE_KEYS}
\ No newline at end of file
@@ -1,35 +1,89 @@
 # app/jobs.py
-import uuid, os, tempfile, subprocess, json, time, requests, sys, logging
-from google.cloud import storage
-from google import generativeai as genai
-from google.auth import default
-from google.auth.transport.requests import Request
-from google.cloud import aiplatform
-from elevenlabs.client import ElevenLabs
-from rq import Queue
+import uuid, os, re, time, random, hashlib, base64, threading, requests, logging, tempfile, itertools, subprocess, wave
+import orjson
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING
+from rq import Queue, get_current_job
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
 import redis
-from app.credential_utils import get_credentials_or_default, create_google_cloud_credentials, create_storage_client, clear_sensitive_data
-from google.cloud.storage import Blob
+from app.credential_utils import create_google_cloud_credentials, create_storage_client, clear_sensitive_data
+
+# The Gemini, ElevenLabs and Google auth SDKs are imported by the cached
+# factories that use them, so processes that never run a given job type
+# (including the API server, which imports this module) don't load them
+if TYPE_CHECKING:
+    import google.ai.generativelanguage as glm
+    from google.generativeai.types import GenerateContentResponse
+    from google.auth.transport.requests import AuthorizedSession
+    from elevenlabs.client import ElevenLabs
+    from google.cloud.storage import Blob
 
 # Note: Gemini API is configured per-request to use appropriate credentials
 # Global configuration removed to prevent interference with user-provided credentials
 
-# Configure Google Cloud Storage with separate credentials
+# Environment defaults, read once at import so jobs don't re-query os.environ
+GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school")
+VERTEX_AI_REGION = os.getenv("VERTEX_AI_REGION", "us-central1")
+VEO_MODEL_ID = os.getenv("VEO_MODEL_ID", "veo-3.0-generate-preview")
+IMAGEN_MODEL_ID = os.getenv("IMAGEN_MODEL_ID", "imagen-3.0-fast-generate-001")  # Imagen 3 Fast - cheapest at $0.02/image
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+XI_KEY = os.getenv("XI_KEY")
+
+# Configure Google Cloud Storage with separate credentials. Storage clients are
+# created lazily by create_storage_client and cached per credentials, so the
+# in-process SimpleWorker reuses them across jobs. Nothing with open sockets is
+# built at import, which keeps a forking RQ_WORKER_CLASS safe as well
 BUCKET = os.getenv("GCS_BUCKET")
-# Use explicit credentials for Cloud Storage if provided
-gcs_credentials_path = os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH")
-if gcs_credentials_path:
-    client = storage.Client.from_service_account_json(gcs_credentials_path)
-else:
-    # Fall back to default credentials
-    client = storage.Client()
-bucket = client.bucket(BUCKET)
-
-def make_blob_public_safe(blob: Blob) -> str:
+
+# Set GCS_PUBLIC_BUCKET=true when the bucket uses uniform bucket-level access with
+# a public read policy; objects are then public on upload and make_public() is skipped
+GCS_PUBLIC_BUCKET = os.getenv("GCS_PUBLIC_BUCKET", "").lower() in ("1", "true", "yes")
+
+# Buckets seen rejecting per-object ACLs, so later blobs skip the make_public() call.
+# The set covers later jobs in the same worker process; the mode is also recorded
+# in Redis so other workers, restarted workers and the API server pick it up
+_uniform_access_buckets = set()
+UNIFORM_ACCESS_KEY = "gcs:uniform-access:{}"
+UNIFORM_ACCESS_TTL_SECONDS = 24 * 60 * 60
+
+def _bucket_uses_uniform_access(bucket_name: str) -> bool:
+    """Whether this bucket is known to use uniform bucket-level access."""
+    if bucket_name in _uniform_access_buckets:
+        return True
+    try:
+        if redis_conn.exists(UNIFORM_ACCESS_KEY.format(bucket_name)):
+            _uniform_access_buckets.add(bucket_name)
+            return True
+    except redis.RedisError as e:
+        logger.debug("Could not read bucket access mode for %s: %s", bucket_name, e)
+    return False
+
+def _remember_uniform_access(bucket_name: str) -> None:
+    """Record that a bucket uses uniform bucket-level access."""
+    _uniform_access_buckets.add(bucket_name)
+    try:
+        redis_conn.set(UNIFORM_ACCESS_KEY.format(bucket_name), 1, ex=UNIFORM_ACCESS_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.debug("Could not record bucket access mode for %s: %s", bucket_name, e)
+
+def public_blob_url(blob: "Blob") -> str:
+    """Build the public HTTPS URL for a blob without any API call."""
+    return f"https://storage.googleapis.com/{blob.bucket.name}/{blob.name}"
+
+def make_blob_public_safe(blob: "Blob") -> str:
     """
     Make a blob publicly accessible, handling both uniform and legacy bucket access.
     Returns the public URL.
     """
+    if GCS_PUBLIC_BUCKET or _bucket_uses_uniform_access(blob.bucket.name):
+        return public_blob_url(blob)
     try:
         # Try legacy ACL method first
         blob.make_public()
@@ -38,84 +92,372 @@ def make_blob_public_safe(blob: Blob) -> str:
         if "uniform bucket-level access" in str(e).lower():
             # For uniform bucket-level access, we need to ensure the bucket allows public access
             # The blob is already publicly accessible if the bucket allows it
-            # Return the public URL format
-            return f"https://storage.googleapis.com/{blob.bucket.name}/{blob.name}"
+            # Remember the bucket so the failing ACL call isn't repeated for every blob
+            _remember_uniform_access(blob.bucket.name)
+            return public_blob_url(blob)
         else:
             # Re-raise other exceptions
             raise e
 
-# Setup logging for debug output
+# Streamed audio uploads: resumable chunk size (must be a multiple of 256 KB) and
+# how much of the local copy is kept in memory before spilling to a temp file
+AUDIO_UPLOAD_CHUNK_SIZE = 256 * 1024
+AUDIO_SPOOL_MAX_BYTES = 4 * 1024 * 1024
+
+# ElevenLabs output format for generated audio. It is constant bitrate, so the
+# duration follows from the byte count without decoding the file
+ELEVENLABS_MP3_FORMAT = "mp3_44100_128"
+ELEVENLABS_MP3_BITRATE = 128000  # bits per second
+
+# Setup logging; set LOG_LEVEL=DEBUG for step-by-step job output.
+# Guard the handler so re-imports don't duplicate every log line
+# An unknown level name falls back to INFO rather than failing the import
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+logger.setLevel(logging.getLevelNamesMapping().get(LOG_LEVEL, logging.INFO))
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+if LOG_LEVEL not in logging.getLevelNamesMapping():
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", LOG_LEVEL)
+
+@lru_cache(maxsize=128)
+def get_elevenlabs_client(api_key: str) -> "ElevenLabs":
+    """
+    Return a shared ElevenLabs client for the given API key.
+    Reusing the client keeps its HTTP connection pool alive across jobs.
+    """
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=api_key)
+
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+
+@lru_cache(maxsize=32)
+def get_gemini_client(api_key: str) -> "glm.GenerativeServiceClient":
+    """
+    Return a shared Gemini client bound to the given API key.
+    Each key gets its own client via client_options rather than the
+    process-wide genai.configure(), so concurrent jobs can't mix up keys.
+    """
+    import google.ai.generativelanguage as glm
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+def gemini_generate_content(api_key: str, prompt: str, model_name: str = GEMINI_MODEL_NAME) -> "GenerateContentResponse":
+    """Generate content from a text prompt with the Gemini client for this key."""
+    import google.ai.generativelanguage as glm
+    from google.generativeai.types import GenerateContentResponse
+    request = glm.GenerateContentRequest(
+        model=f"models/{model_name}",
+        contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])]
+    )
+    return GenerateContentResponse.from_response(get_gemini_client(api_key).generate_content(request))
+
+@lru_cache(maxsize=8)
+def get_openai_client(api_key: str):
+    """
+    Return a shared OpenAI client for the given API key.
+    Reusing the client keeps its HTTP connection pool alive across calls,
+    and HTTP/2 lets concurrent requests (e.g. style analyses served from the
+    API's thread pool) share one TLS connection instead of opening one each.
+    """
+    from openai import OpenAI, DefaultHttpxClient
+    return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(http2=True))
+
+# Voices known to support emotional tags well: Adam, Rachel, Domi
+PREFERRED_VOICE_IDS = ("pNInz6obpgDQGcFmaJgB", "21m00Tcm4TlvDq8ikWAM", "AZnzlk1XvdvUeBnXmlld")
+DEFAULT_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # Adam
+ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
+
+@lru_cache(maxsize=128)
+def select_elevenlabs_voice(api_key: str) -> tuple[str, str]:
+    """
+    Return (voice_id, voice_name) to use for the given ElevenLabs API key.
+    ELEVENLABS_VOICE_ID skips the lookup entirely; otherwise the voice list
+    is fetched once per key. Failed lookups raise and are not cached.
+    """
+    if ELEVENLABS_VOICE_ID:
+        return ELEVENLABS_VOICE_ID, "ELEVENLABS_VOICE_ID"
+    
+    logger.debug("Fetching available voices...")
+    voices = get_elevenlabs_client(api_key).voices.get_all()
+    voice_count = len(voices.voices) if voices.voices else 0
+    logger.debug("Found %s available voices", voice_count)
+    
+    if not voices.voices:
+        return DEFAULT_VOICE_ID, "Adam (default)"
+    
+    # Try to find a preferred voice, otherwise use the first available
+    selected_voice = next(
+        (voice for voice in voices.voices if voice.voice_id in PREFERRED_VOICE_IDS),
+        voices.voices[0]
+    )
+    return selected_voice.voice_id, selected_voice.name
+
+# ElevenLabs models in order of preference; which ones work depends on the account
+ELEVENLABS_MODELS = (
+    "eleven_turbo_v2_5",  # Latest turbo model (if available)
+    "eleven_turbo_v2",    # Turbo v2 
+    "eleven_multilingual_v2",  # Multilingual v2
+    "eleven_multilingual_v1",  # Multilingual v1 (most widely available)
+    "eleven_monolingual_v1"    # Monolingual v1 (fallback)
+)
+
+# Model that last worked for each ElevenLabs account, keyed by a hash of the API
+# key. Also recorded in Redis so other and restarted worker processes try it
+# first instead of repeating the failed requests for models the account lacks
+_working_tts_models = {}
+TTS_MODEL_KEY = "elevenlabs:working-model:{}"
+TTS_MODEL_TTL_SECONDS = 24 * 60 * 60
+
+def _api_key_digest(api_key: str) -> str:
+    """Identify an API key in cache keys without storing the key itself."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:32]
+
+def elevenlabs_models_for(api_key: str) -> list:
+    """Return ELEVENLABS_MODELS with the model last known to work for this key first."""
+    digest = _api_key_digest(api_key)
+    model_name = _working_tts_models.get(digest)
+    if model_name is None:
+        try:
+            cached = redis_conn.get(TTS_MODEL_KEY.format(digest))
+        except redis.RedisError as e:
+            logger.debug("Could not read working ElevenLabs model: %s", e)
+            cached = None
+        if cached:
+            model_name = cached.decode("utf-8")
+            _working_tts_models[digest] = model_name
+    if model_name not in ELEVENLABS_MODELS:
+        return list(ELEVENLABS_MODELS)
+    return [model_name] + [name for name in ELEVENLABS_MODELS if name != model_name]
+
+def remember_elevenlabs_model(api_key: str, model_name: str) -> None:
+    """Record the model that worked for this key, if it changed."""
+    digest = _api_key_digest(api_key)
+    if _working_tts_models.get(digest) == model_name:
+        return
+    _working_tts_models[digest] = model_name
+    try:
+        redis_conn.set(TTS_MODEL_KEY.format(digest), model_name, ex=TTS_MODEL_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.debug("Could not record working ElevenLabs model: %s", e)
+
+# Connections kept per Vertex AI host for each session. Requests wait for a
+# free pooled connection instead of opening extra ones, so concurrent status
+# checks (e.g. /mcp/{job_id} polling on the API server) share a few
+# keep-alive connections rather than one TLS connection each
+VERTEX_MAX_CONNECTIONS = int(os.getenv("VERTEX_MAX_CONNECTIONS", "4"))
+
+# Transient Vertex AI errors are retried at the HTTP layer with exponential
+# backoff (honouring Retry-After), so a brief 429/5xx doesn't fail the job.
+# Read errors and dropped connections are never retried (read=0, other=0):
+# the request may already have been processed. raise_on_status=False hands
+# the last response back so raise_for_status() still reports persistent errors
+VERTEX_RETRY = Retry(
+    total=4,
+    read=0,
+    other=0,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# Calls that start paid generations (Veo predictLongRunning, Imagen predict)
+# are only retried on statuses that mean the request was not accepted (429
+# and 503); a 500/502/504 may still have started one. The broader
+# VERTEX_RETRY is meant for idempotent lookups such as fetchPredictOperation
+VERTEX_SUBMIT_RETRY = VERTEX_RETRY.new(status_forcelist=(429, 503))
+
+@lru_cache(maxsize=64)
+def _authorized_session(google_credentials, retry: Retry = VERTEX_RETRY) -> "AuthorizedSession":
+    """
+    Build one AuthorizedSession per (memoized) credentials object and retry
+    policy. The session refreshes the OAuth token itself when it expires and
+    keeps its pooled keep-alive connections across requests.
+    """
+    from google.auth.transport.requests import AuthorizedSession
+    session = AuthorizedSession(google_credentials)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,  # one pool per regional endpoint host
+        pool_maxsize=VERTEX_MAX_CONNECTIONS,
+        pool_block=True,
+        max_retries=retry
+    ))
+    return session
+
+def get_vertex_session(creds_dict: dict, retry: Retry = VERTEX_RETRY) -> "AuthorizedSession":
+    """Return the shared authorized HTTP session for Vertex AI calls with these credentials."""
+    google_credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict.get('google_cloud_credentials'))
+    return _authorized_session(google_credentials, retry)
+
+@lru_cache(maxsize=64)
+def vertex_model_url(project_id: str, location_id: str, model_id: str, method: str) -> str:
+    """
+    Build the Vertex AI publisher-model endpoint URL for a method such as
+    predict, predictLongRunning or fetchPredictOperation. Cached, since the
+    same few combinations are requested on every submit and poll.
+    """
+    return (
+        f"https://{location_id}-aiplatform.googleapis.com/v1/projects/{project_id}"
+        f"/locations/{location_id}/publishers/google/models/{model_id}:{method}"
+    )
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# (connect, read) timeouts for Vertex AI calls. A stalled connect to an
+# unreachable endpoint fails fast; the read timeout keeps AuthorizedSession's
+# 120s default since Imagen predictions can take a while to return
+VERTEX_TIMEOUT = (5, 120)
+
+def post_json(session: requests.Session, url: str, payload: dict) -> requests.Response:
+    """POST a JSON payload serialized with orjson, which yields bytes ready to send."""
+    return session.post(url, data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=VERTEX_TIMEOUT)
+
+def call_vertex_model(creds_dict: dict, model_id: str, method: str, payload: dict, retry: Retry = VERTEX_RETRY) -> dict:
+    """
+    POST a payload to a Vertex AI publisher-model method in the credentials'
+    project and region, and return the decoded JSON response. HTTP errors
+    are raised after the session's own retries (per `retry`) are exhausted.
+    """
+    project_id = creds_dict.get('google_cloud_project') or GOOGLE_CLOUD_PROJECT
+    location_id = creds_dict.get('vertex_ai_region') or VERTEX_AI_REGION
+    url = vertex_model_url(project_id, location_id, model_id, method)
+    
+    # Lazy %-formatting so nothing is serialized unless DEBUG is enabled
+    logger.debug("VERTEX: POST %s", url)
+    logger.debug("VERTEX: Request data: %s", payload)
+    
+    response = post_json(get_vertex_session(creds_dict, retry), url, payload)
+    logger.debug("VERTEX: Response status: %s (%d bytes)", response.status_code, len(response.content))
+    response.raise_for_status()
+    
+    return orjson.loads(response.content)
 
 # Redis connection and queue setup
 redis_conn = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 q = Queue(connection=redis_conn)
 
-def convert_audio_format(audio_bytes: bytes, source_format: str, target_format: str) -> tuple[bytes, str]:
+def queue_meta_save(job, pipeline) -> None:
+    """Queue the same meta write job.save_meta() makes on a Redis pipeline."""
+    pipeline.hset(job.key, 'meta', job.serializer.dumps(job.meta))
+
+def update_job_progress(job, progress: int, current_step: str, step_number: int, total_steps: int, message: str = None, pipeline=None):
     """
-    Convert audio from one format to another using PyDub.
-    Returns (converted_audio_bytes, mime_type)
+    Record a progress step in the job's metadata and notify WebSocket clients.
+    The meta write (what job.save_meta() does) and the progress PUBLISH are
+    sent in one pipelined round trip, without MULTI/EXEC since they needn't
+    be atomic. If a pipeline is passed, both commands are queued on it for
+    the caller to execute.
+
+    `message` overrides the notified step text.
     """
-    from pydub import AudioSegment
-    from io import BytesIO
-    
-    # Load audio from bytes
-    if source_format == "pcm":
-        # For raw PCM data from ElevenLabs, specify the audio parameters
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), 
-            format="raw", 
-            frame_rate=44100, 
-            channels=1, 
-            sample_width=2
-        )
-    else:
-        audio = AudioSegment.from_file(BytesIO(audio_bytes), format=source_format)
+    from app.websocket_manager import manager
     
-    # Convert to target format
+    job.meta.update({
+        'progress': progress,
+        'current_step': current_step,
+        'step_number': step_number,
+        'total_steps': total_steps
+    })
+    pipe = pipeline if pipeline is not None else job.connection.pipeline(transaction=False)
+    queue_meta_save(job, pipe)
+    manager.notify_progress(job.get_id(), progress, message or current_step, step_number, total_steps, pipeline=pipe)
+    if pipeline is None:
+        pipe.execute()
+
+# ffmpeg output settings per target format: (codec/container args, file suffix, mime type)
+_FFMPEG_OUTPUTS = {
+    "m4a": (["-c:a", "aac", "-f", "mp4", "-movflags", "+faststart"], ".m4a", "audio/mp4"),  # AAC in MP4 container
+    "mp3": (["-c:a", "libmp3lame", "-f", "mp3"], ".mp3", "audio/mpeg"),
+    "wav": (["-c:a", "pcm_s16le", "-f", "wav"], ".wav", "audio/wav"),
+}
+
+# Raw PCM from ElevenLabs: 16-bit little-endian mono
+PCM_SAMPLE_RATE = 44100
+
+def _pcm_to_wav(pcm_data: bytes) -> bytes:
+    """Wrap raw 16-bit mono PCM samples in a WAV container without ffmpeg."""
     output = BytesIO()
+    with wave.open(output, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(PCM_SAMPLE_RATE)
+        wav_file.writeframes(pcm_data)
+    return output.getvalue()
+
+def convert_audio_format(audio_data, source_format: str, target_format: str) -> tuple[bytes, str]:
+    """
+    Convert audio from one format to another with a single ffmpeg process.
+    audio_data may be raw bytes or a readable binary file object.
+    Returns (converted_audio_bytes, mime_type)
     
-    if target_format == "m4a":
-        # Export as M4A (AAC in MP4 container)
-        audio.export(output, format="mp4", codec="aac")
-        mime_type = "audio/mp4"
-    elif target_format == "mp3":
-        audio.export(output, format="mp3")
-        mime_type = "audio/mpeg"
-    elif target_format == "wav":
-        audio.export(output, format="wav")
-        mime_type = "audio/wav"
-    else:
+    The source is piped straight into ffmpeg, so no decoded PCM copy is held
+    in Python. Output goes to a temp file because MP4 and WAV need a seekable
+    output to finalize their headers.
+    """
+    if target_format not in _FFMPEG_OUTPUTS:
         raise ValueError(f"Unsupported target format: {target_format}")
+    output_args, suffix, mime_type = _FFMPEG_OUTPUTS[target_format]
     
-    output.seek(0)
-    return output.read(), mime_type
+    source_bytes = audio_data if isinstance(audio_data, (bytes, bytearray)) else audio_data.read()
+    
+    # Already in the requested format: nothing to decode or re-encode
+    if source_format == target_format:
+        return bytes(source_bytes), mime_type
+    
+    if source_format == "pcm":
+        if target_format == "wav":
+            # WAV is just a fixed-size RIFF header in front of the PCM samples
+            return _pcm_to_wav(source_bytes), mime_type
+        # For raw PCM data from ElevenLabs, specify the audio parameters
+        input_args = ["-f", "s16le", "-ar", str(PCM_SAMPLE_RATE), "-ac", "1"]
+    else:
+        input_args = ["-f", source_format]
+    
+    with tempfile.NamedTemporaryFile(suffix=suffix) as output:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             *input_args, "-i", "pipe:0", *output_args, output.name],
+            input=source_bytes,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg conversion to {target_format} failed: {result.stderr.decode(errors='replace').strip()}")
+        return output.read(), mime_type
+
+# Script text patterns, compiled once at import
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_WORD = re.compile(r'\S+')
+_RE_HEADER = re.compile(r'^#+\s*', re.MULTILINE)
+_RE_CODE_BLOCK = re.compile(r'```[\s\S]*?```')
+_RE_INLINE_CODE = re.compile(r'`([^`]*)`')
+_RE_LINK = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+_RE_LIST_MARKER = re.compile(r'^[ \t]*[-\*\+][ \t]+', re.MULTILINE)
+_RE_BRACKETED = re.compile(r'\[([^\]]+)\]')
+_RE_PERIOD_NO_SPACE = re.compile(r'\.(\w)')
+_RE_SENTENCE_SPACING = re.compile(r'([.!?])\s*([A-Z])')
+
+def count_words(text: str) -> int:
+    """Count whitespace-separated words by scanning matches instead of splitting."""
+    return sum(1 for _ in _RE_WORD.finditer(text))
 
 def estimate_script_duration(text: str, words_per_minute: int = 150) -> float:
     """
     Estimate the duration of a script in seconds based on word count.
     Uses a more accurate word counting method that accounts for natural speech patterns.
     """
-    import re
-    
-    # Remove extra whitespace and normalize
-    text = re.sub(r'\s+', ' ', text.strip())
-    
-    # Count words more accurately by splitting on whitespace
-    words = text.split()
-    word_count = len(words)
+    # Count whitespace-separated words without building a list of them
+    word_count = count_words(text)
     
     # Estimate duration in seconds
     duration_minutes = word_count / words_per_minute
     duration_seconds = duration_minutes * 60
     
-    logger.debug(f"Script analysis: {word_count} words, estimated {duration_seconds:.1f} seconds at {words_per_minute} WPM")
+    logger.debug("Script analysis: %s words, estimated %.1f seconds at %s WPM", word_count, duration_seconds, words_per_minute)
     
     return duration_seconds
 
@@ -123,96 +465,125 @@ def truncate_script_to_duration(text: str, max_duration_seconds: int, words_per_
     """
     Truncate script to fit within the maximum duration while preserving sentence boundaries.
     """
-    import re
-    
     # Calculate maximum allowed words
     max_words = int((max_duration_seconds / 60) * words_per_minute)
     
-    # Split into sentences (look for sentence endings)
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    
-    truncated_sentences = []
+    # Walk the words once; a word ending in '.', '!' or '?' (or the last word)
+    # closes a sentence, and the text is cut after the last sentence that fits
+    stripped = text.strip()
     word_count = 0
+    words_seen = 0
+    cut = 0
+    last_index = len(stripped)
     
-    for sentence in sentences:
-        sentence_words = len(sentence.split())
+    for match in _RE_WORD.finditer(stripped):
+        words_seen += 1
         
-        # If adding this sentence would exceed the limit, stop
-        if word_count + sentence_words > max_words:
-            logger.debug(f"Truncating at {word_count} words to stay within {max_words} word limit")
+        # If this word would exceed the limit, stop at the previous sentence end
+        if words_seen > max_words:
+            logger.debug("Truncating at %s words to stay within %s word limit", word_count, max_words)
             break
-            
-        truncated_sentences.append(sentence)
-        word_count += sentence_words
+        
+        end = match.end()
+        if end == last_index or stripped[end - 1] in '.!?':
+            cut = end
+            word_count = words_seen
     
-    truncated_text = ' '.join(truncated_sentences)
+    truncated_text = stripped[:cut]
     
     # Ensure it ends properly (add period if needed)
     if truncated_text and not truncated_text.rstrip().endswith(('.', '!', '?')):
         truncated_text = truncated_text.rstrip() + '.'
     
-    logger.debug(f"Script truncated from {len(text)} to {len(truncated_text)} characters, {word_count} words")
+    logger.debug("Script truncated from %s to %s characters, %s words", len(text), len(truncated_text), word_count)
     
     return truncated_text
 
+def enforce_script_duration(script: str, max_duration_seconds: int, words_per_minute: int = 150) -> str:
+    """
+    Truncate a sanitized script only if it is significantly over the duration limit
+    (2x or more, minimum 30s buffer); otherwise return it unchanged.
+    """
+    violation_threshold = max(max_duration_seconds * 2, max_duration_seconds + 30)
+    
+    # Sanitized scripts have single spaces between words, so every word takes at
+    # least two characters; scripts too short to reach the threshold skip counting
+    threshold_words = violation_threshold / 60 * words_per_minute
+    if (len(script) + 1) // 2 <= threshold_words and not logger.isEnabledFor(logging.DEBUG):
+        return script
+    
+    estimated_duration = estimate_script_duration(script, words_per_minute)
+    logger.debug("Estimated duration: %.1fs, Max allowed: %ss", estimated_duration, max_duration_seconds)
+    
+    if estimated_duration > violation_threshold:
+        logger.debug("Script significantly exceeds duration limit (%.1fs > %.1fs threshold), truncating...", estimated_duration, violation_threshold)
+        script = truncate_script_to_duration(script, max_duration_seconds, words_per_minute)
+        final_duration = estimate_script_duration(script, words_per_minute)
+        logger.debug("After truncation: %.1fs", final_duration)
+    elif estimated_duration > max_duration_seconds:
+        logger.debug("Script slightly exceeds limit (%.1fs > %ss) but within acceptable range", estimated_duration, max_duration_seconds)
+    else:
+        logger.debug("Script duration is within limits")
+    
+    return script
+
 def sanitize_script_text(text: str) -> str:
     """
     Sanitize script text to remove markdown formatting and ensure natural speech.
     Removes asterisks and other formatting while preserving natural punctuation.
     Also validates and cleans emotional tags for ElevenLabs.
     """
-    import re
+    # Scripts are requested without markdown, so each pass is skipped when the
+    # character its pattern needs is absent; a substring check is far cheaper
+    # than a regex scan that can't match
     
-    # Remove all asterisks (markdown bold/italic)
-    text = re.sub(r'\*+', '', text)
+    # Remove all asterisks (markdown bold/italic); a plain character delete
+    # needs no regex at all
+    text = text.replace('*', '')
     
     # Remove markdown headers (# ## ###)
-    text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
+    if '#' in text:
+        text = _RE_HEADER.sub('', text)
     
     # Remove markdown code blocks and inline code
-    text = re.sub(r'```[\s\S]*?```', '', text)
-    text = re.sub(r'`([^`]*)`', r'\1', text)  # Keep content inside inline code
+    if '`' in text:
+        text = _RE_CODE_BLOCK.sub('', text)
+        text = _RE_INLINE_CODE.sub(r'\1', text)  # Keep content inside inline code
     
-    # Remove markdown links [text](url)
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    if '[' in text:
+        # Remove markdown links [text](url)
+        text = _RE_LINK.sub(r'\1', text)
     
     # Remove markdown list markers (- * +) - do this after code blocks to preserve line structure
-    text = re.sub(r'^[ \t]*[-\*\+][ \t]+', '', text, flags=re.MULTILINE)
-    
-    # Remove all bracketed content (no emotional tags)
-    text = re.sub(r'\[([^\]]+)\]', '', text)
+    text = _RE_LIST_MARKER.sub('', text)
     
-    # Clean up whitespace - normalize spaces and line breaks
-    text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces/tabs to single space
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Max 2 consecutive line breaks
+    if '[' in text:
+        # Remove all bracketed content (no emotional tags)
+        text = _RE_BRACKETED.sub('', text)
     
     # Fix spacing around periods when followed by code blocks
-    text = re.sub(r'\.(\w)', r'. \1', text)
+    text = _RE_PERIOD_NO_SPACE.sub(r'. \1', text)
     
     # Ensure proper sentence spacing
-    text = re.sub(r'([.!?])\s*([A-Z])', r'\1 \2', text)
+    text = _RE_SENTENCE_SPACING.sub(r'\1 \2', text)
     
-    # Clean up extra spaces where tags were removed
-    text = re.sub(r'\s+', ' ', text)  # Normalize multiple spaces
+    # Normalize all whitespace in one pass: spaces, tabs and line breaks
+    # (including gaps left where tags were removed) collapse to a single space
+    text = _RE_WHITESPACE.sub(' ', text)
     
     return text.strip()
 
-def make_script_openai(prompt: str, api_key: str, model: str = "gpt-4o", max_duration_seconds: int = 60) -> str:
-    """Generate script using OpenAI GPT models"""
-    from openai import OpenAI
-    
-    logger.debug("=== OPENAI SCRIPT GENERATION START ===")
-    logger.debug(f"Input prompt: {prompt}")
-    logger.debug(f"API key provided: {'Yes' if api_key else 'No'}")
-    logger.debug(f"Model: {model}")
-    
-    client = OpenAI(api_key=api_key)
-    
+@lru_cache(maxsize=32)
+def _prompt_scaffold(max_duration_seconds: int) -> tuple:
+    """
+    Build the script-generation prompt around the user request once per duration.
+    Returns (prefix, suffix) to be concatenated around the raw prompt.
+    """
     # Calculate estimated word count based on duration (average 150 words per minute)
     max_words = int((max_duration_seconds / 60) * 150)
     
-    # Enhanced prompt for natural human monologue
-    enhanced_prompt = f"""Create a natural, conversational podcast monologue based on this request: {prompt}
+    prefix = "Create a natural, conversational podcast monologue based on this request: "
+    suffix = f"""
 
 CRITICAL DURATION CONSTRAINT:
 - MAXIMUM duration: {max_duration_seconds} seconds ({max_duration_seconds/60:.1f} minutes)
@@ -236,6 +607,20 @@ Requirements:
 Generate ONLY the spoken content - no titles, headers, or formatting. Just the natural monologue text that can be spoken in {max_duration_seconds} seconds. 
 
 IMPORTANT: Respect the {max_duration_seconds} second time limit. Do not generate content that would take significantly longer to speak. Do not include any bracketed tags or special formatting."""
+    return prefix, suffix
+
+def make_script_openai(prompt: str, api_key: str, model: str = "gpt-4o", max_duration_seconds: int = 60) -> str:
+    """Generate script using OpenAI GPT models"""
+    logger.debug("=== OPENAI SCRIPT GENERATION START ===")
+    logger.debug("Input prompt: %s", prompt)
+    logger.debug("API key provided: %s", 'Yes' if api_key else 'No')
+    logger.debug("Model: %s", model)
+    
+    client = get_openai_client(api_key)
+    
+    # Enhanced prompt for natural human monologue
+    prefix, suffix = _prompt_scaffold(max_duration_seconds)
+    enhanced_prompt = prefix + prompt + suffix
     
     logger.debug("Calling OpenAI API for content generation...")
     # GPT-5 models use max_completion_tokens instead of max_tokens and don't support custom temperature
@@ -258,28 +643,14 @@ IMPORTANT: Respect the {max_duration_seconds} second time limit. Do not generate
         )
     
     script = response.choices[0].message.content
-    logger.debug(f"Raw script length: {len(script)} characters")
+    logger.debug("Raw script length: %s characters", len(script))
     
     # Sanitize the script to ensure clean, natural text
     sanitized_script = sanitize_script_text(script)
-    logger.debug(f"Sanitized script length: {len(sanitized_script)} characters")
+    logger.debug("Sanitized script length: %s characters", len(sanitized_script))
     
     # Check for significant duration violations (prevent obvious problems like 3min when 30s requested)
-    estimated_duration = estimate_script_duration(sanitized_script)
-    logger.debug(f"Estimated duration: {estimated_duration:.1f}s, Max allowed: {max_duration_seconds}s")
-    
-    # Only enforce if significantly over limit (2x or more, minimum 30s buffer)
-    violation_threshold = max(max_duration_seconds * 2, max_duration_seconds + 30)
-    
-    if estimated_duration > violation_threshold:
-        logger.debug(f"Script significantly exceeds duration limit ({estimated_duration:.1f}s > {violation_threshold:.1f}s threshold), truncating...")
-        sanitized_script = truncate_script_to_duration(sanitized_script, max_duration_seconds)
-        final_duration = estimate_script_duration(sanitized_script)
-        logger.debug(f"After truncation: {final_duration:.1f}s")
-    elif estimated_duration > max_duration_seconds:
-        logger.debug(f"Script slightly exceeds limit ({estimated_duration:.1f}s > {max_duration_seconds}s) but within acceptable range")
-    else:
-        logger.debug("Script duration is within limits")
+    sanitized_script = enforce_script_duration(sanitized_script, max_duration_seconds)
     
     logger.debug("=== OPENAI SCRIPT GENERATION END ===")
     
@@ -288,67 +659,40 @@ IMPORTANT: Respect the {max_duration_seconds} second time limit. Do not generate
 def make_script_gemini(prompt: str, api_key: str, max_duration_seconds: int = 60) -> str:
     """Generate script using Gemini models (legacy support)"""
     logger.debug("=== GEMINI SCRIPT GENERATION START ===")
-    logger.debug(f"Input prompt: {prompt}")
-    logger.debug(f"API key provided: {'Yes' if api_key else 'No'}")
-    logger.debug(f"API key length: {len(api_key) if api_key else 0}")
+    logger.debug("Input prompt: %s", prompt)
+    logger.debug("API key provided: %s", 'Yes' if api_key else 'No')
+    logger.debug("API key length: %s", len(api_key) if api_key else 0)
     
     # Always use provided API key - no fallback to global configuration
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    logger.debug("Gemini model configured: gemini-2.5-flash")
-    
-    # Calculate estimated word count based on duration (average 150 words per minute)
-    max_words = int((max_duration_seconds / 60) * 150)
+    logger.debug("Gemini model: %s", GEMINI_MODEL_NAME)
     
     # Enhanced prompt for natural human monologue
-    enhanced_prompt = f"""Create a natural, conversational podcast monologue based on this request: {prompt}
-
-CRITICAL DURATION CONSTRAINT:
-- MAXIMUM duration: {max_duration_seconds} seconds ({max_duration_seconds/60:.1f} minutes)
-- Target word count: approximately {max_words} words (150 words per minute speaking rate)
-- MUST stay close to this limit - do not generate significantly longer content
-- If unsure, err on the side of being shorter rather than longer
-
-Requirements:
-- Write as if speaking directly to listeners in a natural, human voice
-- Use conversational language with natural pauses and flow
-- Include verbal connectors like "you know", "well", "so", "now"
-- Vary sentence length for natural rhythm
-- Avoid any markdown formatting, bullet points, or structured lists
-- Sound like spontaneous speech, not written text
-- Use only standard punctuation: periods, commas, question marks, exclamation points
-- Make it engaging and personal, as if talking to a friend
-- Include natural transitions between ideas
-- Keep it conversational and authentic
-- Be concise - focus on the most important points within the time limit
-
-Generate ONLY the spoken content - no titles, headers, or formatting. Just the natural monologue text that can be spoken in {max_duration_seconds} seconds. 
-
-IMPORTANT: Respect the {max_duration_seconds} second time limit. Do not generate content that would take significantly longer to speak. Do not include any bracketed tags or special formatting."""
+    prefix, suffix = _prompt_scaffold(max_duration_seconds)
+    enhanced_prompt = prefix + prompt + suffix
     
-    logger.debug(f"Enhanced prompt length: {len(enhanced_prompt)} characters")
-    logger.debug(f"Enhanced prompt preview: {enhanced_prompt[:200]}...")
+    logger.debug("Enhanced prompt length: %s characters", len(enhanced_prompt))
+    logger.debug("Enhanced prompt preview: %s...", enhanced_prompt[:200])
     
     logger.debug("Calling Gemini API for content generation...")
-    response = model.generate_content(enhanced_prompt)
+    response = gemini_generate_content(api_key, enhanced_prompt)
     logger.debug("Gemini API response received")
     
     # Handle multi-part responses by extracting text from parts
-    logger.debug(f"Response has parts attribute: {hasattr(response, 'parts')}")
-    logger.debug(f"Response has candidates attribute: {hasattr(response, 'candidates')}")
+    logger.debug("Response has parts attribute: %s", hasattr(response, 'parts'))
+    logger.debug("Response has candidates attribute: %s", hasattr(response, 'candidates'))
     
     if hasattr(response, 'parts') and response.parts:
-        logger.debug(f"Processing response.parts - found {len(response.parts)} parts")
+        logger.debug("Processing response.parts - found %s parts", len(response.parts))
         script = ''.join(part.text for part in response.parts if hasattr(part, 'text'))
         logger.debug("Used response.parts method for text extraction")
     elif hasattr(response, 'candidates') and response.candidates:
-        logger.debug(f"Processing response.candidates - found {len(response.candidates)} candidates")
+        logger.debug("Processing response.candidates - found %s candidates", len(response.candidates))
         # Extract text from the first candidate's content parts
         candidate = response.candidates[0]
-        logger.debug(f"Candidate has content: {hasattr(candidate, 'content')}")
+        logger.debug("Candidate has content: %s", hasattr(candidate, 'content'))
         if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
             parts_count = len(candidate.content.parts)
-            logger.debug(f"Candidate content has {parts_count} parts")
+            logger.debug("Candidate content has %s parts", parts_count)
             script = ''.join(part.text for part in candidate.content.parts if hasattr(part, 'text'))
             logger.debug("Used candidate.content.parts method for text extraction")
         else:
@@ -358,31 +702,17 @@ IMPORTANT: Respect the {max_duration_seconds} second time limit. Do not generate
         script = response.text  # Fallback for simple responses
         logger.debug("Used response.text fallback - no parts or candidates found")
     
-    logger.debug(f"Raw script length: {len(script)} characters")
-    logger.debug(f"Raw script preview: {script[:200]}...")
+    logger.debug("Raw script length: %s characters", len(script))
+    logger.debug("Raw script preview: %s...", script[:200])
     
     # Sanitize the script to ensure clean, natural text
     logger.debug("Starting script sanitization...")
     sanitized_script = sanitize_script_text(script)
-    logger.debug(f"Sanitized script length: {len(sanitized_script)} characters")
-    logger.debug(f"Sanitized script preview: {sanitized_script[:200]}...")
+    logger.debug("Sanitized script length: %s characters", len(sanitized_script))
+    logger.debug("Sanitized script preview: %s...", sanitized_script[:200])
     
     # Check for significant duration violations (prevent obvious problems like 3min when 30s requested)
-    estimated_duration = estimate_script_duration(sanitized_script)
-    logger.debug(f"Estimated duration: {estimated_duration:.1f}s, Max allowed: {max_duration_seconds}s")
-    
-    # Only enforce if significantly over limit (2x or more, minimum 30s buffer)
-    violation_threshold = max(max_duration_seconds * 2, max_duration_seconds + 30)
-    
-    if estimated_duration > violation_threshold:
-        logger.debug(f"Script significantly exceeds duration limit ({estimated_duration:.1f}s > {violation_threshold:.1f}s threshold), truncating...")
-        sanitized_script = truncate_script_to_duration(sanitized_script, max_duration_seconds)
-        final_duration = estimate_script_duration(sanitized_script)
-        logger.debug(f"After truncation: {final_duration:.1f}s")
-    elif estimated_duration > max_duration_seconds:
-        logger.debug(f"Script slightly exceeds limit ({estimated_duration:.1f}s > {max_duration_seconds}s) but within acceptable range")
-    else:
-        logger.debug("Script duration is within limits")
+    sanitized_script = enforce_script_duration(sanitized_script, max_duration_seconds)
     
     logger.debug("=== GEMINI SCRIPT GENERATION END ===")
     
@@ -393,11 +723,11 @@ def make_script(prompt: str, gemini_api_key: str = None, provider: str = "openai
     Generate script using specified provider (OpenAI by default, Gemini as fallback).
     OpenAI key is managed internally via environment variable.
     """
-    logger.debug(f"=== SCRIPT GENERATION DISPATCH - Provider: {provider} ===")
+    logger.debug("=== SCRIPT GENERATION DISPATCH - Provider: %s ===", provider)
     
     if provider == "openai":
         # Use internal OpenAI key from environment
-        openai_api_key = os.getenv("OPENAI_API_KEY")
+        openai_api_key = OPENAI_API_KEY
         if not openai_api_key:
             raise ValueError("Internal OpenAI API key not configured on server")
         return make_script_openai(prompt, openai_api_key, max_duration_seconds=max_duration_seconds)
@@ -413,19 +743,17 @@ def analyze_writing_style_openai(content: str, api_key: str, model: str = "gpt-4
     """
     Analyze dialogue style for podcast generation using OpenAI GPT models.
     """
-    from openai import OpenAI
-    
     logger.debug("=== OPENAI WRITING STYLE ANALYSIS START ===")
-    logger.debug(f"Input content: {content}")
-    logger.debug(f"API key provided: {'Yes' if api_key else 'No'}")
-    logger.debug(f"Model: {model}")
+    logger.debug("Input content: %s", content)
+    logger.debug("API key provided: %s", 'Yes' if api_key else 'No')
+    logger.debug("Model: %s", model)
     
     # Only allow GPT-4o for writing style analysis
     if model != "gpt-4o":
-        logger.error(f"Unsupported model for writing style analysis: {model}")
+        logger.error("Unsupported model for writing style analysis: %s", model)
         raise ValueError(f"Writing style analysis only supports 'gpt-4o' model. Requested model: {model}")
     
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     prompt = f"""You are a dialogue style expert for podcast generation. Analyze this instruction: "{content}"
 
@@ -455,13 +783,12 @@ Instruction to analyze: {content}
 
 Return only valid JSON:"""
 
-    logger.debug(f"Prompt length: {len(prompt)} characters")
+    logger.debug("Prompt length: %s characters", len(prompt))
     logger.debug("Calling OpenAI API for writing style analysis...")
 
     # Use GPT-4o with standard parameters
     try:
-        logger.debug(f"Making API call with GPT-4o parameters for model: {model}")
-        import time
+        logger.debug("Making API call with GPT-4o parameters for model: %s", model)
         start_time = time.time()
         
         response = client.chat.completions.create(
@@ -475,19 +802,19 @@ Return only valid JSON:"""
         )
         
         end_time = time.time()
-        logger.debug(f"GPT-4o API call completed successfully in {end_time - start_time:.2f} seconds")
+        logger.debug("GPT-4o API call completed successfully in %.2f seconds", end_time - start_time)
     except Exception as api_error:
-        logger.error(f"OpenAI API call failed: {type(api_error).__name__}: {api_error}")
+        logger.error("OpenAI API call failed: %s: %s", type(api_error).__name__, api_error)
         logger.error("=== OPENAI WRITING STYLE ANALYSIS API ERROR ===")
         raise api_error
     
     logger.debug("OpenAI API response received")
-    logger.debug(f"Response type: {type(response)}")
+    logger.debug("Response type: %s", type(response))
     
     try:
         response_text = response.choices[0].message.content.strip()
-        logger.debug(f"Raw response length: {len(response_text)} characters")
-        logger.debug(f"Raw response preview: {response_text[:200]}...")
+        logger.debug("Raw response length: %s characters", len(response_text))
+        logger.debug("Raw response preview: %s...", response_text[:200])
         
         # Remove any markdown code block formatting if present
         if response_text.startswith('```json'):
@@ -498,21 +825,19 @@ Return only valid JSON:"""
             response_text = response_text[:-3]
         
         response_text = response_text.strip()
-        logger.debug(f"Cleaned response length: {len(response_text)} characters")
+        logger.debug("Cleaned response length: %s characters", len(response_text))
         logger.debug("Attempting to parse JSON response...")
         
-        parsed_result = json.loads(response_text)
+        parsed_result = orjson.loads(response_text)
         logger.debug("JSON parsing successful")
-        logger.debug(f"Parsed result keys: {list(parsed_result.keys())}")
+        logger.debug("Parsed result keys: %s", list(parsed_result.keys()))
         logger.debug("=== OPENAI WRITING STYLE ANALYSIS SUCCESS ===")
         
         return parsed_result
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error("=== OPENAI WRITING STYLE ANALYSIS ERROR ===")
-        logger.error(f"JSON parsing error: {e}")
-        logger.error(f"Raw response: {response.choices[0].message.content}")
-        print(f"JSON parsing error: {e}")
-        print(f"Raw response: {response.choices[0].message.content}")
+        logger.error("JSON parsing error: %s", e)
+        logger.error("Raw response: %s", response.choices[0].message.content)
         # Fallback if JSON parsing fails
         logger.debug("Using fallback response due to JSON parsing error")
         logger.debug("=== OPENAI WRITING STYLE ANALYSIS FALLBACK ===")
@@ -537,11 +862,6 @@ def analyze_writing_style_gemini(content: str, api_key: str) -> dict:
     Analyze dialogue style for podcast generation and return structured output using Gemini API.
     Takes a style instruction (e.g., "talk like Trump") and returns podcast generation settings.
     """
-    genai.configure(api_key=api_key)
-    
-    # Use the latest Gemini model for structured output
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    
     # Create a comprehensive prompt for dialogue style analysis
     prompt = f"""You are a dialogue style expert for podcast generation. Given a style instruction, provide podcast generation settings that would make the speaker sound like the requested style/person.
 
@@ -570,7 +890,7 @@ Instruction to analyze: {content}
 Return only valid JSON:"""
     
     # Generate the content with structured output
-    response = model.generate_content(prompt)
+    response = gemini_generate_content(api_key, prompt)
     
     # Parse the JSON response
     try:
@@ -586,10 +906,10 @@ Return only valid JSON:"""
         
         response_text = response_text.strip()
         
-        return json.loads(response_text)
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-        print(f"Raw response: {response.text}")
+        return orjson.loads(response_text)
+    except orjson.JSONDecodeError as e:
+        logger.error("JSON parsing error: %s", e)
+        logger.error("Raw response: %s", response.text)
         # Fallback if JSON parsing fails
         return {
             "tone": "conversational",
@@ -614,7 +934,7 @@ def analyze_writing_style(content: str, provider: str = "openai", gemini_api_key
     """
     if provider == "openai":
         # Use internal OpenAI key from environment
-        openai_api_key = os.getenv("OPENAI_API_KEY")
+        openai_api_key = OPENAI_API_KEY
         if not openai_api_key:
             raise ValueError("Internal OpenAI API key not configured on server")
         return analyze_writing_style_openai(content, openai_api_key)
@@ -626,12 +946,25 @@ def analyze_writing_style(content: str, provider: str = "openai", gemini_api_key
     else:
         raise ValueError(f"Unsupported provider: {provider}. Use 'openai' or 'gemini'.")
 
+# Veo request parameters sent on every submit unless the caller overrides them
+VIDEO_PARAMETER_DEFAULTS = {
+    "aspectRatio": "16:9",
+    "sampleCount": 1,
+    "durationSeconds": 8,
+    "personGeneration": "allow_all",
+    "generateAudio": True,
+    "enhancePrompt": True  # Veo 3 requires this to be True
+}
+# Parameters forwarded to Vertex AI ("model" selects the endpoint instead)
+VIDEO_REQUEST_PARAMETER_KEYS = frozenset(VIDEO_PARAMETER_DEFAULTS) | {"negativePrompt", "resolution", "seed", "storageUri"}
+# Optional media inputs copied into the request instance when provided
+VIDEO_INSTANCE_INPUT_KEYS = ("image", "lastFrame", "video")
+
 def gen_video(video_request: dict, credentials: dict = None) -> str:
     """
     Video generation using Google's full API structure.
     Supports image inputs, video inputs, and all parameters.
     """
-    from rq import get_current_job
     from app.websocket_manager import manager
     
     job = get_current_job()
@@ -639,204 +972,78 @@ def gen_video(video_request: dict, credentials: dict = None) -> str:
     total_steps = 3
     
     try:
-        # Step 1: Initialize authentication
-        job.meta['progress'] = 10
-        job.meta['current_step'] = 'Initializing video generation'
-        job.meta['step_number'] = 1
-        job.meta['total_steps'] = total_steps
-        job.save_meta()
+        # Steps 1 and 2 follow each other immediately, so both progress
+        # updates go out in a single round trip
+        pipe = redis_conn.pipeline(transaction=False)
         
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 10, 'Initializing video generation', 1, total_steps)
+        # Step 1: Initialize authentication
+        update_job_progress(job, 10, 'Initializing video generation', 1, total_steps, pipeline=pipe)
         
         # Get credentials (user-provided or environment defaults)
         creds_dict = credentials if credentials else {}
-        project_id = creds_dict.get('google_cloud_project') or os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school")
-        location_id = creds_dict.get('vertex_ai_region') or os.getenv("VERTEX_AI_REGION", "us-central1")
-        bucket_name = creds_dict.get('gcs_bucket') or os.getenv("GCS_BUCKET")
+        bucket_name = creds_dict.get('gcs_bucket') or BUCKET
         
         # Get model from video request parameters or use default
         parameters = video_request.get("parameters", {})
-        model_id = parameters.get("model") or os.getenv("VEO_MODEL_ID", "veo-3.0-generate-preview")
-        
-        # Create Google Cloud credentials
-        google_credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict.get('google_cloud_credentials'))
-        google_credentials.refresh(Request())
-        access_token = google_credentials.token
-        
-        # Create storage client with appropriate credentials
-        storage_client = create_storage_client(creds_dict)
-        bucket = storage_client.bucket(bucket_name)
-        
-        # Vertex AI configuration
-        api_endpoint = f"{location_id}-aiplatform.googleapis.com"
+        model_id = parameters.get("model") or VEO_MODEL_ID
         
         # Step 2: Submit video generation request
-        job.meta['progress'] = 50
-        job.meta['current_step'] = 'Submitting video generation request'
-        job.meta['step_number'] = 2
-        job.save_meta()
+        update_job_progress(job, 50, 'Submitting video generation request', 2, total_steps, pipeline=pipe)
+        pipe.execute()
         
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 50, 'Submitting video generation request', 2, total_steps)
-        
-        # Build instance from video_request
+        # Build instance from video_request, adding the optional image,
+        # last frame and video inputs that were provided
         instance = {
-            "prompt": video_request["prompt"]
+            "prompt": video_request["prompt"],
+            **{key: video_request[key] for key in VIDEO_INSTANCE_INPUT_KEYS if video_request.get(key)}
         }
         
-        # Add optional image input
-        if video_request.get("image"):
-            instance["image"] = video_request["image"]
-        
-        # Add optional last frame input
-        if video_request.get("lastFrame"):
-            instance["lastFrame"] = video_request["lastFrame"]
-        
-        # Add optional video input
-        if video_request.get("video"):
-            instance["video"] = video_request["video"]
-        
-        # Get parameters with defaults (already extracted above)
+        # Merge caller parameters over the defaults in one pass. Unset (None or
+        # empty) values fall back to the defaults, while falsy values such as
+        # seed=0 are kept. Always set storageUri to automatically save to our
+        # GCS bucket; this prevents base64 responses and saves directly to our bucket
         request_parameters = {
-            "aspectRatio": parameters.get("aspectRatio", "16:9"),
-            "sampleCount": parameters.get("sampleCount", 1),
-            "durationSeconds": parameters.get("durationSeconds", 8),
-            "personGeneration": parameters.get("personGeneration", "allow_all"),
-            "generateAudio": parameters.get("generateAudio", True),
-            "enhancePrompt": parameters.get("enhancePrompt", True)  # Veo 3 requires this to be True
+            **VIDEO_PARAMETER_DEFAULTS,
+            "storageUri": f"gs://{bucket_name}/videos/{job_id}",
+            **{
+                key: value for key, value in parameters.items()
+                if key in VIDEO_REQUEST_PARAMETER_KEYS and value is not None and value != ""
+            }
         }
         
-        # Add optional parameters if provided
-        if parameters.get("negativePrompt"):
-            request_parameters["negativePrompt"] = parameters["negativePrompt"]
-        if parameters.get("resolution"):
-            request_parameters["resolution"] = parameters["resolution"]
-        if parameters.get("seed"):
-            request_parameters["seed"] = parameters["seed"]
-        
-        # Always set storageUri to automatically save to our GCS bucket
-        # This prevents base64 responses and saves directly to our bucket
-        storage_folder = f"gs://{bucket_name}/videos/{job_id}"
-        request_parameters["storageUri"] = parameters.get("storageUri", storage_folder)
-        
         # Prepare request payload matching Google's exact structure
         request_data = {
             "instances": [instance],
             "parameters": request_parameters
         }
         
-        # Submit the long-running operation
-        url = f"https://{api_endpoint}/v1/projects/{project_id}/locations/{location_id}/publishers/google/models/{model_id}:predictLongRunning"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
-        
-        import sys
-        print(f"DEBUG: Submitting request to: {url}", file=sys.stderr)
-        print(f"DEBUG: Request headers: {headers}", file=sys.stderr)
-        print(f"DEBUG: Request data: {json.dumps(request_data, indent=2)}", file=sys.stderr)
-        
-        response = requests.post(url, headers=headers, json=request_data)
-        
-        print(f"DEBUG: Response status: {response.status_code}", file=sys.stderr)
-        print(f"DEBUG: Response content: {response.text}", file=sys.stderr)
-        
-        response.raise_for_status()
-        
-        operation = response.json()
+        # Submit the long-running operation; the shared authorized session
+        # handles token refresh and connection reuse
+        operation = call_vertex_model(creds_dict, model_id, "predictLongRunning", request_data, retry=VERTEX_SUBMIT_RETRY)
         operation_name = operation.get("name")
         
         if not operation_name:
             raise ValueError(f"No operation name returned from API. Response: {operation}")
         
-        print(f"DEBUG: Operation name: {operation_name}", file=sys.stderr)
-        
-        # Initialize video_url variable
-        video_url = None
-        
-        # Immediate status check to catch early failures
-        job.meta['progress'] = 55
-        job.meta['current_step'] = 'Checking initial operation status'
-        job.save_meta()
-        manager.notify_progress(job_id, 55, 'Checking initial operation status', 3, total_steps)
-        
-        print(f"DEBUG: Performing immediate status check for early failure detection", file=sys.stderr)
-        try:
-            # Wait a brief moment for operation to be registered, then check immediately
-            time.sleep(5)
-            immediate_status = fetch_operation_status(operation_name, creds_dict)
-            print(f"DEBUG: Immediate status check result: {immediate_status}", file=sys.stderr)
-            
-            # Check if operation failed immediately
-            if immediate_status.get("done") and "error" in immediate_status:
-                error = immediate_status["error"]
-                error_msg = f"Video generation failed immediately - Code: {error.get('code', 'unknown')}, Message: {error.get('message', 'no message')}"
-                print(f"DEBUG: {error_msg}", file=sys.stderr)
-                raise ValueError(error_msg)
-            
-            # If operation completed immediately (unlikely but possible)
-            if immediate_status.get("done") and "response" in immediate_status:
-                print(f"DEBUG: Operation completed immediately!", file=sys.stderr)
-                response_data = immediate_status["response"]
-                videos = response_data.get("videos", [])
-                if videos and "gcsUri" in videos[0]:
-                    video_gcs_uri = videos[0]["gcsUri"]
-                    blob_path = video_gcs_uri.replace(f"gs://{bucket_name}/", "")
-                    blob = bucket.blob(blob_path)
-                    video_url = make_blob_public_safe(blob)
-                    
-                    # Operation completed immediately, skip polling
-                    video_url = make_blob_public_safe(blob)
-                    print(f"DEBUG: Video ready immediately at: {video_url}", file=sys.stderr)
-                else:
-                    print(f"DEBUG: Operation done but no video found, will continue polling", file=sys.stderr)
-            
-        except Exception as e:
-            print(f"DEBUG: Immediate status check failed (operation still initializing): {e}", file=sys.stderr)
-        
-        # If we got a video URL immediately, we're done
-        if video_url:
-            # Store operation metadata for immediate completion
-            operation_info = {
-                "operation_name": operation_name,
-                "video_request": video_request,
-                "timestamp": time.time(),
-                "job_id": job_id,
-                "project_id": project_id,
-                "location_id": location_id,
-                "video_url": video_url,
-                "video_filename": video_url.split('/')[-1] if video_url.startswith("https://") else "immediate_completion.mp4",
-                "original_video_url": video_url,
-                "source_type": "immediate_completion"
-            }
-            
-            metadata_blob = bucket.blob(f"metadata/{operation_info['video_filename'].replace('.mp4', '.json')}")
-            metadata_blob.upload_from_string(json.dumps(operation_info, indent=2), content_type="application/json")
-            
-            # Mark as complete and clear sensitive data
-            job.meta['progress'] = 100
-            job.meta['current_step'] = 'Complete - Video ready!'
-            job.meta = clear_sensitive_data(job.meta)
-            job.save_meta()
-            
-            manager.notify_completion(job_id, video_url)
-            return video_url
+        logger.debug("Operation name: %s", operation_name)
         
         # Operation is running - store operation info for user to track
-        job.meta['progress'] = 60
-        job.meta['current_step'] = 'Video generation in progress - check status manually'
         job.meta['operation_name'] = operation_name
         job.meta['status'] = 'running'  # Explicitly mark as running, not failed
         job.meta = clear_sensitive_data(job.meta)
-        job.save_meta()
-        
-        # Send WebSocket notification about ongoing operation
-        manager.notify_progress(job_id, 60, 'Video generation in progress - use /mcp/{job_id} or /operation/{operation_name} to check status', 3, total_steps)
+        # Hand status checks to a follow-up job instead of sleeping on this worker;
+        # it catches early failures and keeps polling with backoff until done.
+        # The progress update and the scheduled poll go out in one round trip
+        pipe = redis_conn.pipeline(transaction=False)
+        update_job_progress(
+            job, 60, 'Video generation in progress - check status manually', 3, total_steps,
+            message='Video generation in progress - use /mcp/{job_id} or /operation/{operation_name} to check status',
+            pipeline=pipe
+        )
+        schedule_video_poll(job_id, operation_name, _chained_job_credentials(creds_dict), video_request, pipeline=pipe)
+        pipe.execute()
         
-        print(f"DEBUG: Video generation submitted successfully. Operation: {operation_name}", file=sys.stderr)
-        print(f"DEBUG: Use status endpoints to check progress", file=sys.stderr)
+        logger.debug("Video generation submitted successfully. Operation: %s", operation_name)
         
         # Return a success indicator with operation name
         # This ensures RQ treats the job as successful
@@ -856,6 +1063,183 @@ def gen_video(video_request: dict, credentials: dict = None) -> str:
         raise e
 
 
+# Follow-up polling schedule for submitted video operations. The first check
+# comes quickly to catch requests Vertex rejects right away; generation itself
+# takes ~30-60s, so later checks back off exponentially from the initial delay
+VIDEO_POLL_FIRST_DELAY_SECONDS = float(os.getenv("VIDEO_POLL_FIRST_DELAY_SECONDS", "1"))
+VIDEO_POLL_INITIAL_DELAY_SECONDS = 5
+VIDEO_POLL_MAX_DELAY_SECONDS = 60
+VIDEO_POLL_MAX_ATTEMPTS = 30
+VIDEO_POLL_JITTER = 0.1  # +/- fraction applied to each delay
+
+def _video_poll_delay(attempt: int) -> float:
+    """Un-jittered delay before the given poll attempt."""
+    if attempt == 0:
+        return VIDEO_POLL_FIRST_DELAY_SECONDS
+    return min(VIDEO_POLL_INITIAL_DELAY_SECONDS * (2 ** (attempt - 1)), VIDEO_POLL_MAX_DELAY_SECONDS)
+
+# gen_video returns as soon as the operation is submitted, but the polls keep
+# updating that job afterwards. Its result (and so the job hash) must outlive
+# the longest polling schedule instead of RQ's default 500s; an hour of margin
+# leaves clients time to read the final status
+VIDEO_JOB_RESULT_TTL = int(
+    sum(_video_poll_delay(attempt) for attempt in range(VIDEO_POLL_MAX_ATTEMPTS)) * (1 + VIDEO_POLL_JITTER)
+) + 3600
+
+def schedule_video_poll(job_id: str, operation_name: str, credentials: dict = None, video_request: dict = None, attempt: int = 0, pipeline=None):
+    """
+    Schedule poll_video_operation for a submitted video operation.
+    The first check runs after VIDEO_POLL_FIRST_DELAY_SECONDS; after that the
+    delay doubles with each attempt up to VIDEO_POLL_MAX_DELAY_SECONDS. Each
+    delay is jittered so videos submitted together don't poll in lockstep.
+    Requires the RQ worker to run with --with-scheduler. If a pipeline is
+    passed, the scheduling commands are queued on it for the caller to execute.
+    """
+    delay = _video_poll_delay(attempt) * random.uniform(1 - VIDEO_POLL_JITTER, 1 + VIDEO_POLL_JITTER)
+    q.enqueue_in(
+        timedelta(seconds=delay),
+        poll_video_operation,
+        job_id, operation_name, credentials, video_request, attempt,
+        pipeline=pipeline
+    )
+
+# Credential fields the chained poll and metadata jobs carry in their own
+# args. Those args are written to Redis on every re-enqueue, so the service
+# account key is left out and read back from the gen_video job's args instead
+_CHAINED_CREDENTIAL_KEYS = ('google_cloud_project', 'vertex_ai_region', 'gcs_bucket')
+
+def _chained_job_credentials(creds_dict: dict) -> dict:
+    """Strip credentials down to the non-secret fields chained video jobs carry."""
+    return {key: creds_dict[key] for key in _CHAINED_CREDENTIAL_KEYS if creds_dict.get(key)}
+
+def _fetch_video_job(job_id: str):
+    """Return the original gen_video job, or None if it has expired from Redis."""
+    try:
+        return Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        logger.warning("POLL: Job %s no longer exists", job_id)
+        return None
+
+def _video_job_credentials(job, credentials: dict = None) -> dict:
+    """Re-attach the gen_video job's service account key to chained-job credentials."""
+    creds_dict = dict(credentials or {})
+    if job is not None and not creds_dict.get('google_cloud_credentials') and len(job.args) > 1 and job.args[1]:
+        creds_dict['google_cloud_credentials'] = job.args[1].get('google_cloud_credentials')
+    return creds_dict
+
+def _fail_video_job(job, job_id: str, operation_name: str, error_msg: str) -> dict:
+    """
+    Mark the original gen_video job (if it still exists) as failed and notify
+    WebSocket clients. Returns the poll job's result for the failed operation.
+    """
+    from app.websocket_manager import manager
+    
+    logger.warning("POLL: %s", error_msg)
+    if job is not None:
+        job.meta['status'] = 'failed'
+        job.meta['current_step'] = 'Job failed'
+        job.meta['error'] = error_msg
+        job.save_meta()
+    manager.notify_error(job_id, error_msg)
+    return {"status": "failed", "operation_name": operation_name, "error": error_msg}
+
+def poll_video_operation(job_id: str, operation_name: str, credentials: dict = None, video_request: dict = None, attempt: int = 0):
+    """
+    Check a submitted video operation on behalf of the original gen_video job.
+    Reports failures and completion to the original job's metadata and WebSocket
+    clients, and re-schedules itself while the operation is still running.
+    """
+    from app.websocket_manager import manager
+    
+    # The original job is normally kept for VIDEO_JOB_RESULT_TTL, but if it has
+    # expired anyway the operation is still finished without it (on the
+    # server's default credentials, since the job held the user's key)
+    job = _fetch_video_job(job_id)
+    creds_dict = _video_job_credentials(job, credentials)
+    
+    try:
+        operation_status = fetch_operation_status(operation_name, creds_dict)
+    except Exception as e:
+        # Treat lookup errors as transient and try again on the next attempt
+        logger.debug("POLL: Status check failed for %s: %s", operation_name, e)
+        operation_status = {}
+    
+    if not operation_status.get("done"):
+        if attempt + 1 < VIDEO_POLL_MAX_ATTEMPTS:
+            schedule_video_poll(job_id, operation_name, _chained_job_credentials(creds_dict), video_request, attempt + 1)
+            return {"status": "running", "operation_name": operation_name}
+        return _fail_video_job(
+            job, job_id, operation_name,
+            f"Video generation did not finish after {attempt + 1} status checks - operation: {operation_name}"
+        )
+    
+    # Operation finished with an error
+    if "error" in operation_status:
+        error = operation_status["error"]
+        return _fail_video_job(
+            job, job_id, operation_name,
+            f"Video generation failed - Code: {error.get('code', 'unknown')}, Message: {error.get('message', 'no message')}"
+        )
+    
+    # A finished operation without a video is what Vertex returns when the
+    # output was removed by its safety filters
+    response_data = operation_status.get("response", {})
+    videos = response_data.get("videos", [])
+    if not (videos and "gcsUri" in videos[0]):
+        error_msg = "Video generation finished without a video"
+        filtered = response_data.get("raiMediaFilteredReasons")
+        if filtered:
+            error_msg += f" - filtered: {filtered}"
+        return _fail_video_job(job, job_id, operation_name, error_msg)
+    
+    bucket_name = creds_dict.get('gcs_bucket') or BUCKET
+    try:
+        bucket = create_storage_client(creds_dict).bucket(bucket_name)
+        video_gcs_uri = videos[0]["gcsUri"]
+        blob_path = video_gcs_uri.removeprefix(f"gs://{bucket_name}/")
+        video_url = make_blob_public_safe(bucket.blob(blob_path))
+    except Exception as e:
+        return _fail_video_job(job, job_id, operation_name, f"Video generated but could not be published: {e}")
+    logger.debug("POLL: Video ready at: %s", video_url)
+    
+    # Store operation metadata alongside the video
+    operation_info = {
+        "operation_name": operation_name,
+        "video_request": video_request,
+        "timestamp": time.time(),
+        "job_id": job_id,
+        "project_id": creds_dict.get('google_cloud_project') or GOOGLE_CLOUD_PROJECT,
+        "location_id": creds_dict.get('vertex_ai_region') or VERTEX_AI_REGION,
+        "video_url": video_url,
+        "video_filename": video_url.rsplit('/', 1)[-1] if video_url.startswith("https://") else f"{job_id}.mp4",
+        "original_video_url": video_url,
+        "source_type": "operation_poll"
+    }
+    
+    # Nothing reads the metadata file back, so write it from a separate job
+    # rather than holding up the completion notification on a GCS upload.
+    # The meta write and that enqueue share one pipelined round trip
+    pipe = redis_conn.pipeline(transaction=False)
+    if job is not None:
+        # Mark the original job as complete
+        job.meta['progress'] = 100
+        job.meta['current_step'] = 'Complete - Video ready!'
+        job.meta['status'] = 'completed'
+        job.meta['video_url'] = video_url
+        queue_meta_save(job, pipe)
+    q.enqueue(write_video_metadata, operation_info, bucket_name, _chained_job_credentials(creds_dict), job_timeout=60, pipeline=pipe)
+    pipe.execute()
+    
+    manager.notify_completion(job_id, video_url)
+    return video_url
+
+def write_video_metadata(operation_info: dict, bucket_name: str, credentials: dict = None):
+    """Store a finished video's operation metadata next to it in the bucket."""
+    creds_dict = _video_job_credentials(_fetch_video_job(operation_info['job_id']), credentials)
+    bucket = create_storage_client(creds_dict).bucket(bucket_name)
+    metadata_blob = bucket.blob(f"metadata/{operation_info['video_filename'].replace('.mp4', '.json')}")
+    metadata_blob.upload_from_string(orjson.dumps(operation_info), content_type="application/json")
+
 def fetch_operation_status(operation_name: str, credentials: dict = None) -> dict:
     """
     Query the status of a video generation operation using Google's fetchPredictOperation endpoint.
@@ -864,17 +1248,8 @@ def fetch_operation_status(operation_name: str, credentials: dict = None) -> dic
     try:
         # Get credentials (user-provided or environment defaults)
         creds_dict = credentials if credentials else {}
-        project_id = creds_dict.get('google_cloud_project') or os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school")
-        location_id = creds_dict.get('vertex_ai_region') or os.getenv("VERTEX_AI_REGION", "us-central1")
         # For fetch operation, we need to use the default model since we don't have the original request
-        model_id = os.getenv("VEO_MODEL_ID", "veo-3.0-generate-preview")
-        
-        # Create Google Cloud credentials
-        google_credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict.get('google_cloud_credentials'))
-        google_credentials.refresh(Request())
-        
-        # Vertex AI configuration
-        api_endpoint = f"{location_id}-aiplatform.googleapis.com"
+        model_id = VEO_MODEL_ID
         
         # Prepare request payload for fetchPredictOperation
         request_data = {
@@ -882,60 +1257,115 @@ def fetch_operation_status(operation_name: str, credentials: dict = None) -> dic
         }
         
         # Submit fetchPredictOperation request
-        url = f"https://{api_endpoint}/v1/projects/{project_id}/locations/{location_id}/publishers/google/models/{model_id}:fetchPredictOperation"
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Authorization": f"Bearer {google_credentials.token}"
-        }
+        return call_vertex_model(creds_dict, model_id, "fetchPredictOperation", request_data)
+        
+    except Exception as e:
+        logger.debug("FETCH: Error fetching operation status: %s", e)
+        raise e
+
+def generate_podcast_thumbnail(prompt: str, thumbnail_prompt: str, creds_dict: dict, bucket, abandoned: threading.Event = None) -> str:
+    """
+    Generate a square podcast thumbnail with Vertex AI Imagen and upload it.
+    Returns the public URL, or None if generation fails (a thumbnail is optional).
+    If `abandoned` is set before the upload (the job failed), nothing is uploaded.
+    """
+    thumbnail_url = None
+    try:
+        # Generate thumbnail using Vertex AI Imagen API
+        logger.debug("Generating podcast thumbnail using Vertex AI Imagen 3 Fast")
+        
+        # Use custom thumbnail prompt if provided, otherwise create one based on the main prompt
+        if thumbnail_prompt:
+            final_thumbnail_prompt = f"{thumbnail_prompt}. NO TEXT, NO WORDS, NO LETTERS, NO TYPOGRAPHY - only visual elements and icons."
+            logger.debug("Using custom thumbnail prompt: %s", thumbnail_prompt)
+        else:
+            final_thumbnail_prompt = f"{prompt}. NO TEXT, NO WORDS, NO LETTERS, NO TYPOGRAPHY - only visual elements and icons."
+            logger.debug("Using auto-generated thumbnail prompt based on main prompt")
+            logger.debug("Auto-generated prompt: %s", final_thumbnail_prompt)
         
-        import sys
-        print(f"DEBUG FETCH: Querying operation status at: {url}", file=sys.stderr)
-        print(f"DEBUG FETCH: Request data: {json.dumps(request_data, indent=2)}", file=sys.stderr)
+        # Vertex AI Imagen API configuration (using cheapest model)
+        # Use cheapest Imagen model by default, configurable via environment
+        model_id = IMAGEN_MODEL_ID
+        logger.debug("Model ID: %s", model_id)
         
-        response = requests.post(url, headers=headers, json=request_data)
+        # Prepare request payload for Imagen
+        request_data = {
+            "instances": [{
+                "prompt": final_thumbnail_prompt
+            }],
+            "parameters": {
+                "sampleCount": 1,
+                "aspectRatio": "1:1",  # Square thumbnail
+                "safetyFilterLevel": "block_some",
+                "personGeneration": "dont_allow"
+            }
+        }
         
-        print(f"DEBUG FETCH: Response status: {response.status_code}", file=sys.stderr)
-        print(f"DEBUG FETCH: Response content: {response.text}", file=sys.stderr)
+        # Submit image generation request; each predict is a paid generation,
+        # so it gets the same narrow retry policy as a video submit
+        result = call_vertex_model(creds_dict, model_id, "predict", request_data, retry=VERTEX_SUBMIT_RETRY)
+        logger.debug("THUMBNAIL: Response received")
+        
+        # Extract image data from response
+        if "predictions" in result and len(result["predictions"]) > 0:
+            prediction = result["predictions"][0]
+            if "bytesBase64Encoded" in prediction:
+                # Decode base64 image data
+                image_data = base64.b64decode(prediction["bytesBase64Encoded"])
+                
+                if abandoned is not None and abandoned.is_set():
+                    logger.debug("THUMBNAIL: Job failed, skipping upload")
+                    return None
         
-        response.raise_for_status()
+                # Upload thumbnail to storage
+                thumbnail_blob = bucket.blob(f"thumbnails/{uuid.uuid4()}.png")
+                thumbnail_blob.upload_from_string(image_data, content_type="image/png")
+                thumbnail_url = make_blob_public_safe(thumbnail_blob)
         
-        return response.json()
+                logger.debug("THUMBNAIL: Thumbnail generated and uploaded: %s", thumbnail_url)
+            else:
+                logger.warning("No image data in Imagen response")
+        else:
+            logger.warning("No predictions in Imagen response")
         
     except Exception as e:
-        print(f"DEBUG FETCH: Error fetching operation status: {e}", file=sys.stderr)
-        raise e
+        logger.warning("Thumbnail generation failed: %s", e)
+        # Continue without thumbnail - not critical
+    
+    return thumbnail_url
 
 def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool = False, thumbnail_prompt: str = None, provider: str = "openai", audio_format: str = "m4a", max_duration_seconds: int = 60) -> dict:
-    from rq import get_current_job
     from app.websocket_manager import manager
-    import time
     
     job = get_current_job()
     job_id = job.get_id()
     total_steps = 5 if generate_thumbnail else 4
     
     logger.debug("=== AUDIO GENERATION START ===")
-    logger.debug(f"Job ID: {job_id}")
-    logger.debug(f"Input prompt: {prompt}")
-    logger.debug(f"Generate thumbnail: {generate_thumbnail}")
-    logger.debug(f"Thumbnail prompt: {thumbnail_prompt}")
-    logger.debug(f"Total steps: {total_steps}")
-    
+    logger.debug("Job ID: %s", job_id)
+    logger.debug("Input prompt: %s", prompt)
+    logger.debug("Generate thumbnail: %s", generate_thumbnail)
+    logger.debug("Thumbnail prompt: %s", thumbnail_prompt)
+    logger.debug("Total steps: %s", total_steps)
+    
+    thumbnail_future = None
+    thumbnail_abandoned = threading.Event()
+    mp3_spool = None
     try:
         # Get credentials (user-provided or environment defaults)
         creds_dict = credentials if credentials else {}
-        logger.debug(f"Credentials provided: {'Yes' if credentials else 'No'}")
+        logger.debug("Credentials provided: %s", 'Yes' if credentials else 'No')
         
-        gemini_api_key = creds_dict.get('gemini_api_key') or os.getenv("GEMINI_API_KEY")
-        openai_api_key = creds_dict.get('openai_api_key') or os.getenv("OPENAI_API_KEY")
-        elevenlabs_api_key = creds_dict.get('elevenlabs_api_key') or os.getenv("XI_KEY")
-        bucket_name = creds_dict.get('gcs_bucket') or os.getenv("GCS_BUCKET")
+        gemini_api_key = creds_dict.get('gemini_api_key') or GEMINI_API_KEY
+        openai_api_key = creds_dict.get('openai_api_key') or OPENAI_API_KEY
+        elevenlabs_api_key = creds_dict.get('elevenlabs_api_key') or XI_KEY
+        bucket_name = creds_dict.get('gcs_bucket') or BUCKET
         
-        logger.debug(f"Provider: {provider}")
-        logger.debug(f"Gemini API key available: {'Yes' if gemini_api_key else 'No'}")
-        logger.debug(f"OpenAI API key available: {'Yes' if openai_api_key else 'No'}")
-        logger.debug(f"ElevenLabs API key available: {'Yes' if elevenlabs_api_key else 'No'}")
-        logger.debug(f"GCS bucket: {bucket_name}")
+        logger.debug("Provider: %s", provider)
+        logger.debug("Gemini API key available: %s", 'Yes' if gemini_api_key else 'No')
+        logger.debug("OpenAI API key available: %s", 'Yes' if openai_api_key else 'No')
+        logger.debug("ElevenLabs API key available: %s", 'Yes' if elevenlabs_api_key else 'No')
+        logger.debug("GCS bucket: %s", bucket_name)
         
         # Create storage client with appropriate credentials
         logger.debug("Creating storage client...")
@@ -943,88 +1373,58 @@ def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool =
         bucket = storage_client.bucket(bucket_name)
         logger.debug("Storage client created successfully")
         
+        # Voice selection doesn't depend on the script, so run it on a
+        # background thread while the script is generated
+        background = ThreadPoolExecutor(max_workers=1)
+        voice_future = background.submit(select_elevenlabs_voice, elevenlabs_api_key)
+        background.shutdown(wait=False)
+        
         # Step 1: Generate script
         logger.debug("STEP 1: Starting script generation")
-        job.meta['progress'] = 10
-        job.meta['current_step'] = 'Generating script with AI'
-        job.meta['step_number'] = 1
-        job.meta['total_steps'] = total_steps
-        job.save_meta()
-        
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 10, 'Generating script with AI', 1, total_steps)
+        update_job_progress(job, 10, 'Generating script with AI', 1, total_steps)
         
-        logger.debug(f"Calling make_script function with provider: {provider}, max_duration: {max_duration_seconds}s...")
+        logger.debug("Calling make_script function with provider: %s, max_duration: %ss...", provider, max_duration_seconds)
         script = make_script(prompt, gemini_api_key, provider, max_duration_seconds)
-        logger.debug(f"Script generated successfully - length: {len(script)} characters")
+        logger.debug("Script generated successfully - length: %s characters", len(script))
+        
+        # The thumbnail is paid for and uploaded publicly, so it only starts once
+        # the script exists; it then overlaps audio synthesis, and a later failure
+        # cancels it (or at least its upload)
+        if generate_thumbnail:
+            thumbnailer = ThreadPoolExecutor(max_workers=1)
+            thumbnail_future = thumbnailer.submit(generate_podcast_thumbnail, prompt, thumbnail_prompt, creds_dict, bucket, thumbnail_abandoned)
+            thumbnailer.shutdown(wait=False)
         
         # Step 2: Initialize ElevenLabs and get voice
         logger.debug("STEP 2: Initializing ElevenLabs TTS")
-        job.meta['progress'] = 30
-        job.meta['current_step'] = 'Initializing text-to-speech engine'
-        job.meta['step_number'] = 2
-        job.save_meta()
+        update_job_progress(job, 30, 'Initializing text-to-speech engine', 2, total_steps)
         
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 30, 'Initializing text-to-speech engine', 2, total_steps)
+        logger.debug("Getting ElevenLabs client...")
+        el = get_elevenlabs_client(elevenlabs_api_key)
+        logger.debug("ElevenLabs client ready")
         
-        logger.debug("Creating ElevenLabs client...")
-        el = ElevenLabs(api_key=elevenlabs_api_key)
-        logger.debug("ElevenLabs client created")
-        
-        # Get available voices and prefer ones that support emotional tags
+        # Pick a voice (env override, or cached per-key lookup) that supports emotional tags
         try:
-            logger.debug("Fetching available voices...")
-            voices = el.voices.get_all()
-            voice_count = len(voices.voices) if voices.voices else 0
-            logger.debug(f"Found {voice_count} available voices")
-            
-            # Prefer voices known to support emotional tags well
-            preferred_voices = ["pNInz6obpgDQGcFmaJgB", "21m00Tcm4TlvDq8ikWAM", "AZnzlk1XvdvUeBnXmlld"]  # Adam, Rachel, Domi
-            selected_voice = None
-            
-            if voices.voices:
-                # Try to find a preferred voice
-                for voice in voices.voices:
-                    if voice.voice_id in preferred_voices:
-                        selected_voice = voice
-                        break
-                
-                # If no preferred voice found, use the first available
-                if not selected_voice:
-                    selected_voice = voices.voices[0]
-                
-                voice_id = selected_voice.voice_id
-                voice_name = selected_voice.name
-            else:
-                voice_id = "pNInz6obpgDQGcFmaJgB"  # Default Adam voice ID
-                voice_name = "Adam (default)"
-            
-            logger.debug(f"Selected voice: {voice_name} (ID: {voice_id}) - supports emotional tags")
+            voice_id, voice_name = voice_future.result()
+            logger.debug("Selected voice: %s (ID: %s) - supports emotional tags", voice_name, voice_id)
         except Exception as e:
             # Fallback to a known voice ID for Adam (supports emotional tags)
-            voice_id = "pNInz6obpgDQGcFmaJgB"
-            logger.debug(f"Voice fetch failed, using fallback voice ID: {voice_id}, Error: {e}")
+            voice_id = DEFAULT_VOICE_ID
+            logger.debug("Voice fetch failed, using fallback voice ID: %s, Error: %s", voice_id, e)
         
         # Step 3: Generate audio
         logger.debug("STEP 3: Converting text to speech")
-        job.meta['progress'] = 60
-        job.meta['current_step'] = 'Converting text to speech'
-        job.meta['step_number'] = 3
-        job.save_meta()
-        
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 60, 'Converting text to speech', 3, total_steps)
+        update_job_progress(job, 60, 'Converting text to speech', 3, total_steps)
         
-        logger.debug(f"Generating audio with voice {voice_id}...")
-        logger.debug(f"Text to convert: {len(script)} characters")
-        logger.debug(f"Target audio format: {audio_format}")
+        logger.debug("Generating audio with voice %s...", voice_id)
+        logger.debug("Text to convert: %s characters", len(script))
+        logger.debug("Target audio format: %s", audio_format)
         
         # Always generate MP3 first for consistent web playback
-        elevenlabs_format = "mp3_44100_128"
+        elevenlabs_format = ELEVENLABS_MP3_FORMAT
         source_format = "mp3"
         
-        logger.debug(f"Using ElevenLabs format: {elevenlabs_format} (always MP3 first)")
+        logger.debug("Using ElevenLabs format: %s (always MP3 first)", elevenlabs_format)
         
         # Configure ElevenLabs generation settings
         from elevenlabs import VoiceSettings
@@ -1037,196 +1437,128 @@ def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool =
         
         logger.debug("Generating MP3 audio with ElevenLabs...")
         
-        # Try different models in order of preference
-        models_to_try = [
-            "eleven_turbo_v2_5",  # Latest turbo model (if available)
-            "eleven_turbo_v2",    # Turbo v2 
-            "eleven_multilingual_v2",  # Multilingual v2
-            "eleven_multilingual_v1",  # Multilingual v1 (most widely available)
-            "eleven_monolingual_v1"    # Monolingual v1 (fallback)
-        ]
+        # Try different models in order of preference, starting with the one
+        # that last worked for this account
+        models_to_try = elevenlabs_models_for(elevenlabs_api_key)
         
-        audio_generator = None
+        audio_chunks = None
+        first_chunk = None
         last_error = None
         
         for model_name in models_to_try:
             try:
-                logger.debug(f"Trying ElevenLabs model: {model_name}")
-                audio_generator = el.generate(
+                logger.debug("Trying ElevenLabs model: %s", model_name)
+                audio_chunks = iter(el.generate(
                     text=script, 
                     voice=voice_id, 
                     voice_settings=voice_settings,
                     model=model_name,
                     output_format=elevenlabs_format
-                )
-                logger.debug(f"Successfully using model: {model_name}")
+                ))
+                # The request is only sent once the generator is consumed, so pull
+                # the first chunk here to surface model errors inside this loop
+                first_chunk = next(audio_chunks, b"")
+                logger.debug("Successfully using model: %s", model_name)
+                remember_elevenlabs_model(elevenlabs_api_key, model_name)
                 break
             except Exception as e:
-                logger.debug(f"Model {model_name} failed: {e}")
+                logger.debug("Model %s failed: %s", model_name, e)
+                audio_chunks = None
                 last_error = e
                 continue
         
-        if audio_generator is None:
-            logger.error(f"All ElevenLabs models failed. Last error: {last_error}")
+        if audio_chunks is None:
+            logger.error("All ElevenLabs models failed. Last error: %s", last_error)
             raise Exception(f"Unable to generate audio with any available ElevenLabs model. Last error: {last_error}")
-        logger.debug("Audio generation started, converting generator to bytes...")
-        mp3_audio_bytes = b"".join(audio_generator)  # Convert generator to bytes
-        logger.debug(f"MP3 audio generated successfully - size: {len(mp3_audio_bytes)} bytes")
         
-        # Convert to target format if needed (keep MP3 separate)
-        converted_audio_bytes = None
-        converted_content_type = None
-        if audio_format != "mp3":
-            logger.debug(f"Converting MP3 to {audio_format}...")
+        # Stream the MP3 straight into a resumable GCS upload as chunks arrive, so
+        # the upload overlaps synthesis. A spooled copy (disk-backed beyond
+        # AUDIO_SPOOL_MAX_BYTES) is kept only when it's needed for format conversion.
+        file_uuid = str(uuid.uuid4())
+        mp3_filename = f"audio/{file_uuid}.mp3"
+        logger.debug("Streaming MP3 audio to cloud storage as %s...", mp3_filename)
+        mp3_blob = bucket.blob(mp3_filename)
+        mp3_spool = tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MAX_BYTES) if audio_format != "mp3" else None
+        mp3_writer = mp3_blob.open("wb", content_type="audio/mpeg", chunk_size=AUDIO_UPLOAD_CHUNK_SIZE)
+        mp3_size = 0
+        try:
+            for chunk in itertools.chain((first_chunk,), audio_chunks):
+                if chunk:
+                    mp3_writer.write(chunk)
+                    if mp3_spool is not None:
+                        mp3_spool.write(chunk)
+                    mp3_size += len(chunk)
+        except Exception:
+            # An unclosed writer is still closed (and so finalized) when it is
+            # garbage-collected, which would commit a truncated MP3. Finalize it
+            # now and delete the partial object instead
             try:
-                converted_audio_bytes, converted_content_type = convert_audio_format(mp3_audio_bytes, "mp3", audio_format)
-                logger.debug(f"Conversion to {audio_format} completed - new size: {len(converted_audio_bytes)} bytes")
-            except Exception as conversion_error:
-                logger.error(f"Audio conversion to {audio_format} failed: {conversion_error}")
-                logger.debug("Will use MP3 for both display and download")
-                converted_audio_bytes = None
-                converted_content_type = None
-        
-        # Optional Step 4: Generate thumbnail if requested
+                mp3_writer.close()
+                mp3_blob.delete()
+            except Exception as cleanup_error:
+                logger.warning("Could not discard partial upload %s: %s", mp3_filename, cleanup_error)
+            raise
+        mp3_writer.close()
+        logger.debug("MP3 audio generated and uploaded - size: %s bytes", mp3_size)
+        
+        # Convert to target format if needed (keep MP3 separate). ffmpeg runs on a
+        # background thread while this one waits on the thumbnail and MP3 ACL
+        # update; the spool isn't touched again until the result is collected
+        convert_future = None
+        if mp3_spool is not None:
+            logger.debug("Converting MP3 to %s...", audio_format)
+            mp3_spool.seek(0)
+            converter = ThreadPoolExecutor(max_workers=1)
+            convert_future = converter.submit(convert_audio_format, mp3_spool, "mp3", audio_format)
+            converter.shutdown(wait=False)
+        
+        # Optional Step 4: Thumbnail, started after the script
         thumbnail_url = None
         if generate_thumbnail:
-            logger.debug("STEP 4: Starting thumbnail generation")
-            job.meta['progress'] = 70
-            job.meta['current_step'] = 'Generating podcast thumbnail'
-            job.meta['step_number'] = 4
-            job.save_meta()
-            
-            # Send WebSocket notification
-            manager.notify_progress(job_id, 70, 'Generating podcast thumbnail', 4, total_steps)
-            
-            try:
-                # Generate thumbnail using Vertex AI Imagen API
-                logger.debug("Generating podcast thumbnail using Vertex AI Imagen 3 Fast")
-                print(f"Info: Generating podcast thumbnail using Vertex AI Imagen 3 Fast (cheapest model at $0.02/image)", file=sys.stderr)
-                
-                # Use custom thumbnail prompt if provided, otherwise create one based on the main prompt
-                if thumbnail_prompt:
-                    final_thumbnail_prompt = f"{thumbnail_prompt}. NO TEXT, NO WORDS, NO LETTERS, NO TYPOGRAPHY - only visual elements and icons."
-                    logger.debug(f"Using custom thumbnail prompt: {thumbnail_prompt}")
-                    print(f"Info: Using custom thumbnail prompt: {thumbnail_prompt[:50]}...", file=sys.stderr)
-                else:
-                    final_thumbnail_prompt = f"{prompt}. NO TEXT, NO WORDS, NO LETTERS, NO TYPOGRAPHY - only visual elements and icons."
-                    logger.debug("Using auto-generated thumbnail prompt based on main prompt")
-                    logger.debug(f"Auto-generated prompt: {final_thumbnail_prompt}")
-                    print(f"Info: Using auto-generated thumbnail prompt based on main prompt", file=sys.stderr)
-                
-                # Get credentials and project info
-                project_id = creds_dict.get('google_cloud_project') or os.getenv("GOOGLE_CLOUD_PROJECT", "mcp-summer-school")
-                location_id = creds_dict.get('vertex_ai_region') or os.getenv("VERTEX_AI_REGION", "us-central1")
-                logger.debug(f"Project ID: {project_id}")
-                logger.debug(f"Location ID: {location_id}")
-                
-                # Create Google Cloud credentials for Imagen API
-                logger.debug("Creating Google Cloud credentials for Imagen API...")
-                google_credentials, _ = create_google_cloud_credentials(creds_dict, creds_dict.get('google_cloud_credentials'))
-                google_credentials.refresh(Request())
-                access_token = google_credentials.token
-                logger.debug("Google Cloud credentials refreshed successfully")
-                
-                # Vertex AI Imagen API configuration (using cheapest model)
-                api_endpoint = f"{location_id}-aiplatform.googleapis.com"
-                # Use cheapest Imagen model by default, configurable via environment
-                model_id = os.getenv("IMAGEN_MODEL_ID", "imagen-3.0-fast-generate-001")  # Imagen 3 Fast - cheapest at $0.02/image
-                logger.debug(f"API endpoint: {api_endpoint}")
-                logger.debug(f"Model ID: {model_id}")
-                
-                # Prepare request payload for Imagen
-                request_data = {
-                    "instances": [{
-                        "prompt": final_thumbnail_prompt
-                    }],
-                    "parameters": {
-                        "sampleCount": 1,
-                        "aspectRatio": "1:1",  # Square thumbnail
-                        "safetyFilterLevel": "block_some",
-                        "personGeneration": "dont_allow"
-                    }
-                }
-                
-                # Submit image generation request
-                url = f"https://{api_endpoint}/v1/projects/{project_id}/locations/{location_id}/publishers/google/models/{model_id}:predict"
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {access_token}"
-                }
-                
-                print(f"DEBUG THUMBNAIL: Submitting request to: {url}", file=sys.stderr)
-                
-                response = requests.post(url, headers=headers, json=request_data)
-                response.raise_for_status()
-                
-                result = response.json()
-                print(f"DEBUG THUMBNAIL: Response received", file=sys.stderr)
-                
-                # Extract image data from response
-                if "predictions" in result and len(result["predictions"]) > 0:
-                    prediction = result["predictions"][0]
-                    if "bytesBase64Encoded" in prediction:
-                        # Decode base64 image data
-                        import base64
-                        image_data = base64.b64decode(prediction["bytesBase64Encoded"])
-                        
-                        # Upload thumbnail to storage
-                        thumbnail_blob = bucket.blob(f"thumbnails/{uuid.uuid4()}.png")
-                        thumbnail_blob.upload_from_string(image_data, content_type="image/png")
-                        thumbnail_url = make_blob_public_safe(thumbnail_blob)
-                        
-                        print(f"DEBUG THUMBNAIL: Thumbnail generated and uploaded: {thumbnail_url}", file=sys.stderr)
-                    else:
-                        print(f"Warning: No image data in Imagen response", file=sys.stderr)
-                else:
-                    print(f"Warning: No predictions in Imagen response", file=sys.stderr)
-                            
-            except Exception as e:
-                print(f"Warning: Thumbnail generation failed: {e}", file=sys.stderr)
-                # Continue without thumbnail - not critical
+            logger.debug("STEP 4: Waiting for thumbnail generation")
+            update_job_progress(job, 70, 'Generating podcast thumbnail', 4, total_steps)
+            thumbnail_url = thumbnail_future.result()
         
         # Step 4/5: Upload audio files to storage
         next_step = 5 if generate_thumbnail else 4
-        logger.debug(f"STEP {next_step}: Uploading audio files to cloud storage")
-        job.meta['progress'] = 90
-        job.meta['current_step'] = 'Uploading audio files to cloud storage'
-        job.meta['step_number'] = next_step
-        job.save_meta()
-        
-        # Send WebSocket notification
-        manager.notify_progress(job_id, 90, 'Uploading audio files to cloud storage', next_step, total_steps)
-        
-        # Upload MP3 file (always for display)
-        file_uuid = str(uuid.uuid4())
-        mp3_filename = f"audio/{file_uuid}.mp3"
-        logger.debug(f"Creating MP3 blob with filename: {mp3_filename}")
-        mp3_blob = bucket.blob(mp3_filename)
-        
-        logger.debug(f"Uploading MP3 audio bytes to cloud storage...")
-        mp3_blob.upload_from_string(mp3_audio_bytes, content_type="audio/mpeg")
-        logger.debug("MP3 upload completed")
+        logger.debug("STEP %s: Uploading audio files to cloud storage", next_step)
+        update_job_progress(job, 90, 'Uploading audio files to cloud storage', next_step, total_steps)
         
+        # MP3 file (always for display) was already streamed up during synthesis
         logger.debug("Making MP3 blob public...")
         display_audio_url = make_blob_public_safe(mp3_blob)
-        logger.debug(f"MP3 display URL generated: {display_audio_url}")
+        logger.debug("MP3 display URL generated: %s", display_audio_url)
+        
+        converted_audio_bytes = None
+        converted_content_type = None
+        if convert_future is not None:
+            try:
+                converted_audio_bytes, converted_content_type = convert_future.result()
+                logger.debug("Conversion to %s completed - new size: %s bytes", audio_format, len(converted_audio_bytes))
+            except Exception as conversion_error:
+                logger.error("Audio conversion to %s failed: %s", audio_format, conversion_error)
+                logger.debug("Will use MP3 for both display and download")
+                converted_audio_bytes = None
+                converted_content_type = None
+            finally:
+                mp3_spool.close()
         
         # Upload converted file if different format was requested
         download_audio_url = display_audio_url  # Default to MP3
         if converted_audio_bytes is not None and audio_format != "mp3":
             converted_filename = f"audio/{file_uuid}_converted.{audio_format}"
-            logger.debug(f"Creating converted blob with filename: {converted_filename}")
+            logger.debug("Creating converted blob with filename: %s", converted_filename)
             converted_blob = bucket.blob(converted_filename)
             
-            logger.debug(f"Uploading converted audio bytes to cloud storage with content-type: {converted_content_type}...")
+            logger.debug("Uploading converted audio bytes to cloud storage with content-type: %s...", converted_content_type)
             converted_blob.upload_from_string(converted_audio_bytes, content_type=converted_content_type)
             logger.debug("Converted audio upload completed")
             
             logger.debug("Making converted blob public...")
             download_audio_url = make_blob_public_safe(converted_blob)
-            logger.debug(f"Converted download URL generated: {download_audio_url}")
+            logger.debug("Converted download URL generated: %s", download_audio_url)
         else:
-            logger.debug(f"Using MP3 for both display and download (requested format: {audio_format})")
+            logger.debug("Using MP3 for both display and download (requested format: %s)", audio_format)
         
         # Completion and clear sensitive data
         logger.debug("Finalizing job completion...")
@@ -1235,16 +1567,9 @@ def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool =
         job.meta = clear_sensitive_data(job.meta)
         job.save_meta()
         
-        # Calculate audio duration from MP3 bytes
-        try:
-            from pydub import AudioSegment
-            from io import BytesIO
-            audio_segment = AudioSegment.from_file(BytesIO(mp3_audio_bytes), format="mp3")
-            audio_duration_seconds = len(audio_segment) / 1000.0  # Convert milliseconds to seconds
-            logger.debug(f"Audio duration calculated: {audio_duration_seconds:.2f} seconds")
-        except Exception as e:
-            logger.warning(f"Could not calculate audio duration: {e}")
-            audio_duration_seconds = None
+        # Calculate audio duration from the constant-bitrate MP3 size
+        audio_duration_seconds = round(mp3_size * 8 / ELEVENLABS_MP3_BITRATE, 2)
+        logger.debug("Audio duration calculated: %.2f seconds", audio_duration_seconds)
         
         # Send completion notification (use display URL for compatibility)
         manager.notify_completion(job_id, display_audio_url)
@@ -1258,14 +1583,19 @@ def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool =
             "thumbnail_url": thumbnail_url,
             "audio_duration_seconds": audio_duration_seconds
         }
-        logger.debug(f"Final result: {result}")
+        logger.debug("Final result: %s", result)
         logger.debug("=== AUDIO GENERATION END ===")
         return result
     
     except Exception as e:
-        logger.error(f"=== AUDIO GENERATION ERROR ===")
-        logger.error(f"Error in gen_audio: {str(e)}")
-        logger.error(f"Error type: {type(e).__name__}")
+        logger.error("=== AUDIO GENERATION ERROR ===")
+        logger.error("Error in gen_audio: %s", str(e))
+        logger.error("Error type: %s", type(e).__name__)
+        
+        # Don't leave an orphaned public thumbnail behind for a failed job
+        thumbnail_abandoned.set()
+        if thumbnail_future is not None:
+            thumbnail_future.cancel()
         
         # Clear sensitive data even on error
         job = get_current_job()
@@ -1278,4 +1608,10 @@ def gen_audio(prompt: str, credentials: dict = None, generate_thumbnail: bool =
         logger.debug("Sending error notification...")
         manager.notify_error(job_id, str(e))
         logger.error("=== AUDIO GENERATION ERROR END ===")
-        raise e
\ No newline at end of file
+        raise e
+    
+    finally:
+        # The conversion path closes the spool once ffmpeg is done with it;
+        # this also releases it when the job fails before then
+        if mp3_spool is not None:
+            mp3_spool.close()
\ No newline at end of file
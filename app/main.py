@@ -6,13 +6,12 @@ from app.auth_middleware import APIKeyMiddleware
 from app.mcp_models import MCPRequest, MCPResponse, WritingStyleRequest, WritingStyleResponse
 from app.mcp_transport import mcp_transport
 from app.mcp_transport_streamable import streamable_transport
-from app.jobs import gen_video, gen_audio, fetch_operation_status, q, analyze_writing_style
-from app.credential_utils import get_credentials_or_default, validate_credentials, validate_video_parameters
-from google.cloud.storage import Blob
-from google.cloud import storage
+from app.jobs import gen_video, gen_audio, fetch_operation_status, q, analyze_writing_style, make_blob_public_safe, VIDEO_JOB_RESULT_TTL
+from app.credential_utils import get_credentials_or_default, validate_credentials, validate_video_parameters, create_storage_client
 from app.websocket_manager import manager
 import uuid
 import os
+import hmac
 import time
 import asyncio
 import json
@@ -44,31 +43,16 @@ dotenv_path = find_dotenv()
 
 # Configure Google Cloud Storage
 BUCKET = os.getenv("GCS_BUCKET")
-gcs_credentials_path = os.getenv("GOOGLE_CLOUD_CREDENTIALS_PATH")
-if gcs_credentials_path:
-    storage_client = storage.Client.from_service_account_json(gcs_credentials_path)
-else:
-    storage_client = storage.Client()
-bucket = storage_client.bucket(BUCKET)
-
-def make_blob_public_safe(blob: Blob) -> str:
+
+def get_bucket():
     """
-    Make a blob publicly accessible, handling both uniform and legacy bucket access.
-    Returns the public URL.
+    Server bucket handle, built on first use from the shared storage client
+    pool (explicit GOOGLE_CLOUD_CREDENTIALS_PATH or default credentials).
     """
-    try:
-        # Try legacy ACL method first
-        blob.make_public()
-        return blob.public_url
-    except Exception as e:
-        if "uniform bucket-level access" in str(e).lower():
-            # For uniform bucket-level access, we need to ensure the bucket allows public access
-            # The blob is already publicly accessible if the bucket allows it
-            # Return the public URL format
-            return f"https://storage.googleapis.com/{blob.bucket.name}/{blob.name}"
-        else:
-            # Re-raise other exceptions
-            raise e
+    return create_storage_client({'google_cloud_credentials': None}).bucket(BUCKET)
+
+_GS_PREFIX = f"gs://{BUCKET}/"
+_PUBLIC_URL_PREFIX = f"https://storage.googleapis.com/{BUCKET}/"
 
 def resolve_gcs_url(url: str) -> str:
     """
@@ -80,19 +64,19 @@ def resolve_gcs_url(url: str) -> str:
     
     if url.startswith("gs://"):
         # Convert gs://bucket/path to public HTTPS URL
-        blob_path = url.replace(f"gs://{BUCKET}/", "")
-        blob = bucket.blob(blob_path)
+        blob_path = url.removeprefix(_GS_PREFIX)
+        blob = get_bucket().blob(blob_path)
         
         # Make sure blob is public
         try:
             return make_blob_public_safe(blob)
         except Exception as e:
             print(f"Warning: Could not make blob public: {e}")
-            return f"https://storage.googleapis.com/{BUCKET}/{blob_path}"
-    elif url.startswith(f"https://storage.googleapis.com/{BUCKET}/"):
+            return _PUBLIC_URL_PREFIX + blob_path
+    elif url.startswith(_PUBLIC_URL_PREFIX):
         # Already a public HTTPS URL, ensure it's accessible
-        blob_path = url.replace(f"https://storage.googleapis.com/{BUCKET}/", "")
-        blob = bucket.blob(blob_path)
+        blob_path = url.removeprefix(_PUBLIC_URL_PREFIX)
+        blob = get_bucket().blob(blob_path)
         
         try:
             return make_blob_public_safe(blob)
@@ -105,6 +89,9 @@ def resolve_gcs_url(url: str) -> str:
 
 app = FastAPI(title="MCP PdTx Video and Audio generator")
 
+# Server API key, encoded once for the constant-time comparison in /validate
+API_KEY_BYTES = (os.getenv("API_KEY") or "").encode("utf-8")
+
 # Configure CORS origins from environment variable
 allowed_origins = os.getenv("CORS_ORIGINS", "*").split(",")
 allowed_origins = [origin.strip() for origin in allowed_origins]
@@ -236,12 +223,14 @@ def validate_api_key(request: Request):
     Validate API key endpoint.
     Returns a simple response when API key is detected.
     """
-    import os
-    
-    api_key = os.getenv("API_KEY")
-    provided_api_key = request.headers.get("X-API-Key")
-    
-    if not api_key or not provided_api_key or provided_api_key != api_key:
+    # Read the raw header bytes so the key is compared without decoding/re-encoding
+    provided_api_key = None
+    for name, value in request.headers.raw:
+        if name == b"x-api-key":
+            provided_api_key = value
+            break
+    
+    if not API_KEY_BYTES or not provided_api_key or not hmac.compare_digest(provided_api_key, API_KEY_BYTES):
         return {"valid": False}
     
     return {"valid": True}
@@ -393,7 +382,7 @@ def create_task(req: MCPRequest):
         # Remove None values
         video_request = {k: v for k, v in video_request.items() if v is not None}
         
-        job = q.enqueue_call(func=gen_video, args=(video_request, creds_dict), job_id=job_id)
+        job = q.enqueue_call(func=gen_video, args=(video_request, creds_dict), job_id=job_id, result_ttl=VIDEO_JOB_RESULT_TTL)
     else:
         print(f"DEBUG: Regular REST API - audio_format={req.audio_format}, max_duration={req.max_duration_seconds}")
         job = q.enqueue_call(func=gen_audio, args=(req.prompt, creds_dict, req.generate_thumbnail, req.thumbnail_prompt, req.provider, req.audio_format, req.max_duration_seconds), job_id=job_id)
@@ -437,6 +426,8 @@ def check(job_id: str):
     # If we have a custom status and job is finished with a submission result, override status
     if custom_status == 'running' and job_status == 'finished':
         job_status = 'started'  # Show as started/running instead of finished
+    elif custom_status == 'failed' and job_status == 'finished':
+        job_status = 'failed'  # Video operation failed after submission (reported by poller)
     
     # Set status-specific defaults
     if job_status == "queued":
@@ -472,22 +463,28 @@ def check(job_id: str):
             # Video format: {"status": "submitted", "operation_name": "...", "message": "..."}
             elif result.get("status") == "submitted" and result.get("operation_name"):
                 operation_name = result.get("operation_name")
-                # Job submitted successfully, check if operation is complete
-                try:
-                    # TODO: We need to get credentials from job metadata for this call
-                    operation_result = fetch_operation_status(operation_name)
-                    if operation_result.get("done") and "response" in operation_result:
-                        response_data = operation_result["response"]
-                        videos = response_data.get("videos", [])
-                        if videos and "gcsUri" in videos[0]:
-                            gcs_uri = videos[0]["gcsUri"]
-                            url = resolve_gcs_url(gcs_uri)
-                        else:
-                            predictions = response_data.get("predictions", [])
-                            if predictions and "videoUrl" in predictions[0]:
-                                url = resolve_gcs_url(predictions[0]["videoUrl"])
-                except Exception as e:
-                    print(f"Error querying operation status: {e}")
+                # The follow-up poller owns the Vertex AI lookups and records the
+                # outcome in job metadata, so a 'running' job is just reported as
+                # in progress. Only jobs submitted before the poller existed (no
+                # status in their metadata) are still looked up directly
+                if job.meta.get('video_url'):
+                    url = job.meta['video_url']
+                elif custom_status is None:
+                    try:
+                        # TODO: We need to get credentials from job metadata for this call
+                        operation_result = fetch_operation_status(operation_name)
+                        if operation_result.get("done") and "response" in operation_result:
+                            response_data = operation_result["response"]
+                            videos = response_data.get("videos", [])
+                            if videos and "gcsUri" in videos[0]:
+                                gcs_uri = videos[0]["gcsUri"]
+                                url = resolve_gcs_url(gcs_uri)
+                            else:
+                                predictions = response_data.get("predictions", [])
+                                if predictions and "videoUrl" in predictions[0]:
+                                    url = resolve_gcs_url(predictions[0]["videoUrl"])
+                    except Exception as e:
+                        print(f"Error querying operation status: {e}")
         elif isinstance(result, str):
             if result.startswith('http'):
                 # Direct video URL
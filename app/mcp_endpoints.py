@@ -14,7 +14,7 @@ from app.mcp_models import (
     UserCredentials, MCPRequest, WritingStyleRequest
 )
 from app.mcp_protocol import JsonRpcRequest, JsonRpcResponse, McpError, mcp_handler
-from app.jobs import q, make_script, analyze_writing_style, gen_video, gen_audio
+from app.jobs import q, make_script, analyze_writing_style, gen_video, gen_audio, VIDEO_JOB_RESULT_TTL
 from app.credential_utils import get_credentials_or_default, validate_credentials, validate_video_parameters
 import uuid
 import os
@@ -291,7 +291,7 @@ class McpEndpoints:
                 "parameters": video_request.parameters.dict() if video_request.parameters else {}
             }
             
-            job = q.enqueue_call(func=gen_video, args=(video_req_dict, creds_dict), job_id=job_id)
+            job = q.enqueue_call(func=gen_video, args=(video_req_dict, creds_dict), job_id=job_id, result_ttl=VIDEO_JOB_RESULT_TTL)
             
             result = McpToolResult(
                 content=[{
@@ -1,11 +1,20 @@
 # app/websocket_manager.py
 import json
+import orjson
 import asyncio
 from typing import Dict, Set
 from fastapi import WebSocket
 from fastapi.websockets import WebSocketDisconnect
 import redis
 import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bucket URL prefixes used to turn gs:// URIs into public HTTPS URLs
+_BUCKET = os.getenv("GCS_BUCKET")
+_GS_PREFIX = f"gs://{_BUCKET}/"
+_PUBLIC_URL_PREFIX = f"https://storage.googleapis.com/{_BUCKET}/"
 
 class WebSocketManager:
     def __init__(self):
@@ -38,12 +47,10 @@ class WebSocketManager:
                 if not url:
                     return url
                 
-                BUCKET = os.getenv("GCS_BUCKET")
                 if url.startswith("gs://"):
                     # Convert gs://bucket/path to public HTTPS URL
-                    blob_path = url.replace(f"gs://{BUCKET}/", "")
-                    return f"https://storage.googleapis.com/{BUCKET}/{blob_path}"
-                elif url.startswith(f"https://storage.googleapis.com/{BUCKET}/"):
+                    return _PUBLIC_URL_PREFIX + url.removeprefix(_GS_PREFIX)
+                elif url.startswith(_PUBLIC_URL_PREFIX):
                     # Already a public HTTPS URL
                     return url
                 else:
@@ -74,6 +81,8 @@ class WebSocketManager:
             # If we have a custom status and job is finished with a submission result, override status
             if custom_status == 'running' and job_status == 'finished':
                 job_status = 'started'  # Show as started/running instead of finished
+            elif custom_status == 'failed' and job_status == 'finished':
+                job_status = 'failed'  # Video operation failed after submission (reported by poller)
             
             # Set status-specific defaults
             if job_status == "queued":
@@ -109,6 +118,8 @@ class WebSocketManager:
                     # Video format: {"status": "submitted", "operation_name": "...", "message": "..."}
                     elif result.get("status") == "submitted" and result.get("operation_name"):
                         operation_name = result.get("operation_name")
+                        # Set by the follow-up poller once the video is ready
+                        url = job.meta.get('video_url')
                 elif isinstance(result, str):
                     if result.startswith('http'):
                         # Direct video URL
@@ -170,10 +181,13 @@ class WebSocketManager:
             self.disconnect(websocket, job_id)
     
     def notify_progress(self, job_id: str, progress: int, current_step: str, 
-                       step_number: int, total_steps: int, status: str = "started"):
+                       step_number: int, total_steps: int, status: str = "started",
+                       pipeline=None):
         """
         Synchronous method to be called from job functions.
         Publishes progress to Redis for async processing.
+        If a Redis pipeline is given, the PUBLISH is queued on it instead of
+        being sent immediately, so the caller can batch it with other writes.
         """
         message = {
             "job_id": job_id,
@@ -185,7 +199,7 @@ class WebSocketManager:
         }
         
         # Publish to Redis channel for async processing
-        self.redis_client.publish(f"websocket:{job_id}", json.dumps(message))
+        (pipeline or self.redis_client).publish(f"websocket:{job_id}", orjson.dumps(message))
         
         # Also notify MCP clients via SSE
         try:
@@ -201,8 +215,7 @@ class WebSocketManager:
     
     def notify_completion(self, job_id: str, download_url: str):
         """Notify about job completion with full response structure"""
-        import sys
-        print(f"DEBUG WEBSOCKET START: notify_completion called for job {job_id}", file=sys.stderr)
+        logger.debug("notify_completion called for job %s", job_id)
         
         # Get the complete job status like the API endpoint does
         try:
@@ -214,12 +227,10 @@ class WebSocketManager:
                 if not url:
                     return url
                 
-                BUCKET = os.getenv("GCS_BUCKET")
                 if url.startswith("gs://"):
                     # Convert gs://bucket/path to public HTTPS URL
-                    blob_path = url.replace(f"gs://{BUCKET}/", "")
-                    return f"https://storage.googleapis.com/{BUCKET}/{blob_path}"
-                elif url.startswith(f"https://storage.googleapis.com/{BUCKET}/"):
+                    return _PUBLIC_URL_PREFIX + url.removeprefix(_GS_PREFIX)
+                elif url.startswith(_PUBLIC_URL_PREFIX):
                     # Already a public HTTPS URL
                     return url
                 else:
@@ -228,69 +239,77 @@ class WebSocketManager:
             
             job = q.fetch_job(job_id)
             if job is None:
-                return
-                
-            # Get progress info from job metadata
-            progress = job.meta.get('progress', 100)
-            current_step = job.meta.get('current_step', 'Complete')
-            total_steps = job.meta.get('total_steps', 1)
-            step_number = job.meta.get('step_number', total_steps)
-            custom_status = job.meta.get('status', None)
-            operation_name = job.meta.get('operation_name', None)
+                # The job has expired from Redis (e.g. a long video poll);
+                # clients still need to hear where the result is
+                message = {
+                    "job_id": job_id,
+                    "status": "finished",
+                    "progress": 100,
+                    "current_step": "Complete",
+                    "download_url": download_url
+                }
+            else:
+                # Get progress info from job metadata
+                progress = job.meta.get('progress', 100)
+                current_step = job.meta.get('current_step', 'Complete')
+                total_steps = job.meta.get('total_steps', 1)
+                step_number = job.meta.get('step_number', total_steps)
+                custom_status = job.meta.get('status', None)
+                operation_name = job.meta.get('operation_name', None)
             
-            # Determine actual job status
-            job_status = job.get_status()
+                # Determine actual job status
+                job_status = job.get_status()
             
-            # For completion notifications, we always want "finished" status
-            # Override the custom status logic for completion
-            if job.is_finished:
-                job_status = 'finished'
+                # For completion notifications, we always want "finished" status
+                # Override the custom status logic for completion
+                if job.is_finished:
+                    job_status = 'finished'
             
-            result = job.result if job.is_finished else None
+                result = job.result if job.is_finished else None
             
-            # Handle different result formats (same logic as main.py check() function)
-            url = None
-            display_audio_url = None
-            download_audio_url = None
-            thumbnail_url = None
-            audio_duration_seconds = None
+                # Handle different result formats (same logic as main.py check() function)
+                url = None
+                display_audio_url = None
+                download_audio_url = None
+                thumbnail_url = None
+                audio_duration_seconds = None
             
-            if job.is_finished and result:
-                if isinstance(result, dict):
-                    # Audio result format: {"audio_url": "...", "display_audio_url": "...", "download_audio_url": "...", "thumbnail_url": "..."}
-                    if result.get("audio_url"):
-                        url = resolve_gcs_url(result["audio_url"])  # Backward compatibility
-                        display_audio_url = resolve_gcs_url(result["display_audio_url"]) if result.get("display_audio_url") else url
-                        download_audio_url = resolve_gcs_url(result["download_audio_url"]) if result.get("download_audio_url") else url
-                        thumbnail_url = resolve_gcs_url(result["thumbnail_url"]) if result.get("thumbnail_url") else None
-                        audio_duration_seconds = result.get("audio_duration_seconds")
-                    # Video format: {"status": "submitted", "operation_name": "...", "message": "..."}
-                    elif result.get("status") == "submitted" and result.get("operation_name"):
-                        operation_name = result.get("operation_name")
-                        # For video operations that are still running, use the provided download_url
-                        url = download_url
-                elif isinstance(result, str):
-                    # String result (legacy or direct URL)
-                    url = resolve_gcs_url(result)
+                if job.is_finished and result:
+                    if isinstance(result, dict):
+                        # Audio result format: {"audio_url": "...", "display_audio_url": "...", "download_audio_url": "...", "thumbnail_url": "..."}
+                        if result.get("audio_url"):
+                            url = resolve_gcs_url(result["audio_url"])  # Backward compatibility
+                            display_audio_url = resolve_gcs_url(result["display_audio_url"]) if result.get("display_audio_url") else url
+                            download_audio_url = resolve_gcs_url(result["download_audio_url"]) if result.get("download_audio_url") else url
+                            thumbnail_url = resolve_gcs_url(result["thumbnail_url"]) if result.get("thumbnail_url") else None
+                            audio_duration_seconds = result.get("audio_duration_seconds")
+                        # Video format: {"status": "submitted", "operation_name": "...", "message": "..."}
+                        elif result.get("status") == "submitted" and result.get("operation_name"):
+                            operation_name = result.get("operation_name")
+                            # For video operations that are still running, use the provided download_url
+                            url = download_url
+                    elif isinstance(result, str):
+                        # String result (legacy or direct URL)
+                        url = resolve_gcs_url(result)
             
-            # If we still don't have a URL, use the provided download_url
-            if not url:
-                url = download_url
+                # If we still don't have a URL, use the provided download_url
+                if not url:
+                    url = download_url
             
-            message = {
-                "job_id": job_id,
-                "status": job_status,
-                "download_url": url,
-                "display_audio_url": display_audio_url,
-                "download_audio_url": download_audio_url,
-                "thumbnail_url": thumbnail_url,
-                "audio_duration_seconds": audio_duration_seconds,
-                "progress": progress,
-                "current_step": current_step,
-                "total_steps": total_steps,
-                "step_number": step_number,
-                "operation_name": operation_name
-            }
+                message = {
+                    "job_id": job_id,
+                    "status": job_status,
+                    "download_url": url,
+                    "display_audio_url": display_audio_url,
+                    "download_audio_url": download_audio_url,
+                    "thumbnail_url": thumbnail_url,
+                    "audio_duration_seconds": audio_duration_seconds,
+                    "progress": progress,
+                    "current_step": current_step,
+                    "total_steps": total_steps,
+                    "step_number": step_number,
+                    "operation_name": operation_name
+                }
             
         except Exception as e:
             # Fallback to simple message if something goes wrong
@@ -305,12 +324,10 @@ class WebSocketManager:
                 "download_url": download_url
             }
         
-        # Debug logging
-        import sys
-        print(f"DEBUG WEBSOCKET: Publishing completion message for job {job_id}", file=sys.stderr)
-        print(f"DEBUG WEBSOCKET: Message: {json.dumps(message, indent=2)}", file=sys.stderr)
+        # Debug logging; the message is only formatted when DEBUG is enabled
+        logger.debug("Publishing completion message for job %s: %s", job_id, message)
         
-        self.redis_client.publish(f"websocket:{job_id}", json.dumps(message))
+        self.redis_client.publish(f"websocket:{job_id}", orjson.dumps(message))
         
         # Also notify MCP clients via SSE
         try:
@@ -334,7 +351,7 @@ class WebSocketManager:
             "error": error_message
         }
         
-        self.redis_client.publish(f"websocket:{job_id}", json.dumps(message))
+        self.redis_client.publish(f"websocket:{job_id}", orjson.dumps(message))
         
         # Also notify MCP clients via SSE
         try:
@@ -79,7 +79,11 @@ fi
 if [ "$1" = "worker" ]; then
     echo "Starting RQ worker..."
     export PYTHONWARNINGS='ignore::UserWarning'
-    exec rq worker --url redis://redis:6379/0
+    # SimpleWorker runs jobs in the worker process instead of forking a
+    # work-horse per job, so imported SDKs and cached clients are reused
+    RQ_WORKER_CLASS="${RQ_WORKER_CLASS:-rq.worker.SimpleWorker}"
+    echo "Worker class: $RQ_WORKER_CLASS"
+    exec rq worker --with-scheduler --worker-class "$RQ_WORKER_CLASS" --url redis://redis:6379/0
 elif [ "$1" = "app" ] || [ -z "$1" ]; then
     echo "Starting FastAPI application..."
     exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
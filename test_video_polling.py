@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test script for the video operation polling and request building in app.jobs
+
+This script tests:
+1. The poll backoff schedule and the gen_video result TTL that must cover it
+2. poll_video_operation's not-done, give-up, error, no-video, publish-failure
+   and success branches, with fetch_operation_status and Redis stubbed out
+3. gen_video's parameter merging (seed=0 kept, unset and unknown keys dropped)
+
+Needs the app's requirements installed, but no Redis server or Google
+credentials: everything that would leave the process is patched.
+"""
+from unittest import mock
+
+import app.jobs as jobs
+from app.websocket_manager import manager
+
+
+class FakeJob:
+    """Just enough of rq.job.Job for the code under test."""
+
+    def __init__(self, job_id="job-1", args=None):
+        self.id = job_id
+        self.key = f"rq:job:{job_id}"
+        self.meta = {}
+        self.args = args or ({}, {})
+        self.saved = 0
+
+    def get_id(self):
+        return self.id
+
+    def save_meta(self):
+        self.saved += 1
+
+
+def check(name: str, passed: bool, detail: str = "") -> bool:
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} {name}")
+    if not passed and detail:
+        print(f"  {detail}")
+    return passed
+
+
+def test_poll_schedule() -> bool:
+    """The backoff doubles up to the cap and the job TTL outlives every poll."""
+    print("🧪 Poll schedule\n")
+    delays = [jobs._video_poll_delay(attempt) for attempt in range(jobs.VIDEO_POLL_MAX_ATTEMPTS)]
+    worst_case = sum(delays) * (1 + jobs.VIDEO_POLL_JITTER)
+
+    results = [
+        check("First poll uses VIDEO_POLL_FIRST_DELAY_SECONDS",
+              delays[0] == jobs.VIDEO_POLL_FIRST_DELAY_SECONDS, f"got {delays[0]}"),
+        check("Second poll uses VIDEO_POLL_INITIAL_DELAY_SECONDS",
+              delays[1] == jobs.VIDEO_POLL_INITIAL_DELAY_SECONDS, f"got {delays[1]}"),
+        check("Delays double until the cap",
+              delays[2] == 2 * delays[1] and delays[3] == 2 * delays[2], f"got {delays[:4]}"),
+        check("Delays never exceed VIDEO_POLL_MAX_DELAY_SECONDS",
+              max(delays) == jobs.VIDEO_POLL_MAX_DELAY_SECONDS, f"max {max(delays)}"),
+        check("VIDEO_JOB_RESULT_TTL covers the jittered worst case",
+              jobs.VIDEO_JOB_RESULT_TTL > worst_case,
+              f"ttl {jobs.VIDEO_JOB_RESULT_TTL}s vs schedule {worst_case:.0f}s"),
+        check("VIDEO_JOB_RESULT_TTL exceeds RQ's 500s default",
+              jobs.VIDEO_JOB_RESULT_TTL > 500, f"ttl {jobs.VIDEO_JOB_RESULT_TTL}s"),
+    ]
+    print()
+    return all(results)
+
+
+def run_poll(operation_status, attempt=0, job=..., publish_error=None):
+    """Run poll_video_operation once against a stubbed operation status (job=None: expired)."""
+    if job is ...:
+        job = FakeJob(args=({}, {"google_cloud_credentials": {"client_email": "sa@example"}}))
+    stubs = {
+        "fetch": mock.patch.object(jobs, "fetch_operation_status", return_value=operation_status),
+        "fetch_job": mock.patch.object(jobs, "_fetch_video_job", return_value=job),
+        "schedule": mock.patch.object(jobs, "schedule_video_poll"),
+        "storage": mock.patch.object(jobs, "create_storage_client"),
+        "publish": mock.patch.object(
+            jobs, "make_blob_public_safe",
+            side_effect=publish_error, return_value="https://storage.googleapis.com/bucket/videos/job-1.mp4"
+        ),
+        "pipeline": mock.patch.object(jobs.redis_conn, "pipeline"),
+        "enqueue": mock.patch.object(jobs.q, "enqueue"),
+        "meta_save": mock.patch.object(jobs, "queue_meta_save"),
+        "notify_error": mock.patch.object(manager, "notify_error"),
+        "notify_completion": mock.patch.object(manager, "notify_completion"),
+    }
+    mocks = {name: patcher.start() for name, patcher in stubs.items()}
+    try:
+        result = jobs.poll_video_operation("job-1", "projects/p/operations/op", {"gcs_bucket": "bucket"}, {"prompt": "x"}, attempt)
+    finally:
+        for patcher in stubs.values():
+            patcher.stop()
+    return result, job, mocks
+
+
+def test_poll_branches() -> bool:
+    """Each terminal outcome is recorded on the job and reported to clients."""
+    print("🧪 poll_video_operation branches\n")
+    results = []
+
+    result, job, mocks = run_poll({"done": False})
+    rescheduled_creds = mocks["schedule"].call_args.args[2] if mocks["schedule"].called else {}
+    results.append(check("Not done: re-schedules the next attempt",
+                         result["status"] == "running" and mocks["schedule"].called, f"got {result}"))
+    results.append(check("Not done: the re-enqueued poll carries no service account key",
+                         "google_cloud_credentials" not in rescheduled_creds, f"got {rescheduled_creds}"))
+    results.append(check("Not done: service account is read back from the gen_video job",
+                         mocks["fetch"].call_args.args[1].get("google_cloud_credentials") == {"client_email": "sa@example"}))
+
+    result, job, mocks = run_poll({}, attempt=jobs.VIDEO_POLL_MAX_ATTEMPTS - 1)
+    results.append(check("Last attempt: gives up and fails the job",
+                         result["status"] == "failed" and job.meta.get("status") == "failed"
+                         and not mocks["schedule"].called and mocks["notify_error"].called, f"got {result}"))
+
+    result, job, mocks = run_poll({"done": True, "error": {"code": 3, "message": "bad prompt"}})
+    results.append(check("Error: fails the job with the operation's message",
+                         job.meta.get("status") == "failed" and "bad prompt" in job.meta.get("error", "")
+                         and job.saved == 1 and mocks["notify_error"].called, f"got {job.meta}"))
+
+    result, job, mocks = run_poll({"done": True, "response": {"raiMediaFilteredReasons": ["unsafe"]}})
+    results.append(check("Done without a video: fails the job",
+                         job.meta.get("status") == "failed" and "unsafe" in job.meta.get("error", "")
+                         and mocks["notify_error"].called, f"got {job.meta}"))
+
+    result, job, mocks = run_poll(
+        {"done": True, "response": {"videos": [{"gcsUri": "gs://bucket/videos/job-1.mp4"}]}},
+        publish_error=RuntimeError("403 Forbidden")
+    )
+    results.append(check("Publish failure: fails the job instead of dropping it",
+                         job.meta.get("status") == "failed" and "403" in job.meta.get("error", "")
+                         and mocks["notify_error"].called, f"got {job.meta}"))
+
+    result, job, mocks = run_poll({"done": True, "response": {"videos": [{"gcsUri": "gs://bucket/videos/job-1.mp4"}]}})
+    metadata_creds = mocks["enqueue"].call_args.args[3] if mocks["enqueue"].called else {}
+    results.append(check("Success: completes the job and notifies clients",
+                         job.meta.get("status") == "completed" and job.meta.get("progress") == 100
+                         and mocks["notify_completion"].called and not mocks["notify_error"].called, f"got {job.meta}"))
+    results.append(check("Success: the metadata job carries no service account key",
+                         "google_cloud_credentials" not in metadata_creds, f"got {metadata_creds}"))
+
+    result, job, mocks = run_poll({"done": True, "error": {"code": 13}}, job=None)
+    results.append(check("Expired job: still notifies clients",
+                         result["status"] == "failed" and mocks["notify_error"].called, f"got {result}"))
+
+    print()
+    return all(results)
+
+
+def build_video_request(parameters: dict) -> dict:
+    """Run gen_video with the Vertex submit stubbed and return the request it sent."""
+    job = FakeJob()
+    with mock.patch.object(jobs, "get_current_job", return_value=job), \
+         mock.patch.object(jobs, "update_job_progress"), \
+         mock.patch.object(jobs, "schedule_video_poll"), \
+         mock.patch.object(jobs.redis_conn, "pipeline"), \
+         mock.patch.object(jobs, "call_vertex_model", return_value={"name": "projects/p/operations/op"}) as submit:
+        jobs.gen_video({"prompt": "a cat", "parameters": parameters}, {"gcs_bucket": "bucket"})
+    return submit.call_args.args[3]
+
+
+def test_video_parameters() -> bool:
+    """Caller parameters are merged over the defaults without dropping falsy values."""
+    print("🧪 gen_video parameters\n")
+    params = build_video_request({
+        "seed": 0,
+        "aspectRatio": "9:16",
+        "durationSeconds": None,
+        "negativePrompt": "",
+        "model": "veo-2.0-generate-preview",
+        "unknownOption": True,
+    })["parameters"]
+
+    results = [
+        check("seed=0 is forwarded", params.get("seed") == 0, f"got {params}"),
+        check("Caller values override defaults", params.get("aspectRatio") == "9:16", f"got {params}"),
+        check("None falls back to the default",
+              params.get("durationSeconds") == jobs.VIDEO_PARAMETER_DEFAULTS["durationSeconds"], f"got {params}"),
+        check("Empty strings are dropped", "negativePrompt" not in params, f"got {params}"),
+        check("model and unknown keys are not forwarded",
+              "model" not in params and "unknownOption" not in params, f"got {params}"),
+        check("Output goes to the job's folder in the bucket",
+              params.get("storageUri") == "gs://bucket/videos/job-1", f"got {params}"),
+    ]
+    print()
+    return all(results)
+
+
+if __name__ == "__main__":
+    passed = all([test_poll_schedule(), test_poll_branches(), test_video_parameters()])
+    if passed:
+        print("🎉 All tests passed! Video polling is working correctly.")
+    else:
+        print("❌ Some tests failed. Please check the video polling functions.")